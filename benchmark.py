@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+from guru_confluence_importer.stub import ConfluenceStub
+
+
+def write_yaml(path, data):
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f)
+
+
+def generate_export(root, version=2, cards=100, images=2, image_size=20000):
+    """Write a synthetic Guru collection export with the given number of cards and images per card."""
+    for directory in ['cards', 'folders', 'boards', 'board-groups', 'resources']:
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    card_ids = []
+    for i in range(cards):
+        card_id = 'card{:05d}'.format(i)
+        card_ids.append(card_id)
+        html = '<p>Synthetic card {}</p><hr/>'.format(i)
+        for j in range(images):
+            image_name = 'img{:05d}-{}.png'.format(i, j)
+            with open(os.path.join(root, 'resources', image_name), 'wb') as f:
+                f.write(os.urandom(image_size))
+            html = html + '<p><img src="resources/{}"/></p>'.format(image_name)
+        html = html + '<p>' + ' '.join(['lorem ipsum dolor sit amet'] * 40) + '</p>'
+        with open(os.path.join(root, 'cards', card_id + '.html'), 'w') as f:
+            f.write(html)
+        write_yaml(os.path.join(root, 'cards', card_id + '.yaml'),
+                   {'ID': card_id, 'Title': 'Card {}'.format(i), 'Tags': ['benchmark', 'tag {}'.format(i % 7)],
+                    'externalLastUpdated': 1670000000000 + i, 'Slug': 'slug-' + card_id})
+
+    half = cards // 2
+    if version == 2:
+        write_yaml(os.path.join(root, 'folders', 'sub.yaml'),
+                   {'Title': 'Sub Folder', 'Items': [{'Type': 'card', 'ID': c} for c in card_ids[half:]]})
+        write_yaml(os.path.join(root, 'folders', 'top.yaml'),
+                   {'Title': 'Top Folder', 'Description': '<p>Synthetic folder</p>',
+                    'Items': [{'Type': 'card', 'ID': c} for c in card_ids[:half]] + [{'Type': 'folder', 'ID': 'sub'}]})
+        write_yaml(os.path.join(root, 'collection.yaml'),
+                   {'Version': 2, 'Items': [{'Type': 'folder', 'ID': 'top', 'Title': 'Top Folder'}]})
+    else:
+        write_yaml(os.path.join(root, 'boards', 'board.yaml'),
+                   {'Title': 'Board', 'Items': [{'Type': 'card', 'ID': c} for c in card_ids[:half]]})
+        write_yaml(os.path.join(root, 'boards', 'grouped.yaml'),
+                   {'Title': 'Grouped Board',
+                    'Items': [{'Type': 'section', 'Title': 'Section',
+                               'Items': [{'Type': 'card', 'ID': c} for c in card_ids[half:]]}]})
+        write_yaml(os.path.join(root, 'board-groups', 'group.yaml'), {'Title': 'Group', 'Boards': ['grouped']})
+        write_yaml(os.path.join(root, 'collection.yaml'),
+                   {'Items': [{'Type': 'board', 'ID': 'board', 'Title': 'Board'},
+                              {'Type': 'boardgroup', 'ID': 'group', 'Title': 'Group'}]})
+
+
+def run_benchmark(args, importer_args):
+    work_dir = tempfile.mkdtemp(prefix='guru-benchmark-')
+    export_dir = os.path.join(work_dir, 'export')
+    generate_export(export_dir, args.version, args.cards, args.images, args.image_size)
+
+    stub = ConfluenceStub(latency=args.latency, throttle_rate=args.throttle_rate).start()
+    metrics_file = os.path.join(work_dir, 'metrics.json')
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            'guruCollectionToConfluence.py'),
+               '--collection-dir', export_dir, '--user', 'benchmark', '--api-key', 'benchmark',
+               '--space-key', 'BENCH', '--parent', '1', '--target-url', stub.url, '--quiet',
+               '--metrics-file', metrics_file,
+               '--journal', os.path.join(work_dir, 'journal.jsonl'),
+               '--manifest', os.path.join(work_dir, 'manifest.json')] + importer_args
+    started = time.monotonic()
+    subprocess.run(command, check=True)
+    wall_seconds = time.monotonic() - started
+    stats = stub.stats()
+    stub.stop()
+
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+    pages = max(metrics['pages'], 1)
+    print('cards:            {} ({} images each, export v{})'.format(args.cards, args.images, args.version))
+    print('importer options: {}'.format(' '.join(importer_args) or '(defaults)'))
+    print('pages:            {} ({} failed)'.format(metrics['pages'], metrics['failed']))
+    print('wall time:        {:.2f}s'.format(wall_seconds))
+    if metrics['parse_seconds'] is not None:
+        print('parse time:       {:.2f}s'.format(metrics['parse_seconds']))
+    print('upload time:      {:.2f}s'.format(metrics['upload_seconds']))
+    print('pages/sec:        {:.2f}'.format(metrics['pages'] / max(metrics['upload_seconds'], 0.001)))
+    print('requests:         {} ({:.2f} per page, {} throttled)'.format(
+        stats['total_requests'], stats['total_requests'] / pages, stats['requests'].get('throttled', 0)))
+    print('bytes sent:       {} ({:.1f} KB per page)'.format(stats['bytes_received'],
+                                                            stats['bytes_received'] / pages / 1024))
+    for endpoint, count in sorted(stats['requests'].items()):
+        print('  {:<55} {}'.format(endpoint, count))
+    print('phases:')
+    for phase, phase_stats in sorted(metrics['phases'].items()):
+        print('  {:<20} {:>6} calls {:>9.2f}s total {:>8.3f}s mean {:>8.3f}s max'.format(
+            phase, phase_stats['count'], phase_stats['seconds'], phase_stats['mean_seconds'],
+            phase_stats['max_seconds']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark guruCollectionToConfluence.py against a local Confluence stub. '
+                    'Unknown options are passed through to the importer.')
+    parser.add_argument('--cards', type=int, default=100, help='number of synthetic cards (default: 100)')
+    parser.add_argument('--images', type=int, default=2, help='images per card (default: 2)')
+    parser.add_argument('--image-size', dest='image_size', type=int, default=20000,
+                        help='size of every image in bytes (default: 20000)')
+    parser.add_argument('--export-version', dest='version', type=int, choices=[1, 2], default=2,
+                        help='Guru export format to generate (default: 2)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds of latency the stub adds to every response (default: 0.05)')
+    parser.add_argument('--throttle-rate', dest='throttle_rate', type=float, default=0.0,
+                        help='fraction of requests the stub answers with 429 (default: 0)')
+    args, importer_args = parser.parse_known_args()
+    run_benchmark(args, importer_args)
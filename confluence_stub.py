@@ -0,0 +1,6 @@
+from guru_confluence_importer.stub import ConfluenceStub
+from guru_confluence_importer.stub import main
+
+# kept so existing invocations keep working, the stub lives in the guru_confluence_importer package
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Imports Guru collections into Atlassian Confluence.
+
+    from guru_confluence_importer import ImportConfig, Importer
+
+    config = ImportConfig(space_key='DOCS', parent='123456', user='me@example.com', api_key='...',
+                          organization='example', collection_dir='export')
+    summary = Importer(config).run()
+"""
+
+# resolved on first use, so the command line starts without loading requests, BeautifulSoup or PyYAML
+_EXPORTS = {
+    'ImportConfig': '.config',
+    'Importer': '.importer',
+    'main': '.cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
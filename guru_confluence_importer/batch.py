@@ -0,0 +1,95 @@
+import dataclasses
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import AdaptiveTokenBucket
+from .client import ConfluenceClient
+from .client import RetryPolicy
+from .importer import Importer
+from .metrics import Metrics
+from .metrics import ProgressReporter
+from .pages import TitlePlanner
+
+
+class BatchImporter:
+    """Imports several collections concurrently through one client, sharing its connection pool and request rate."""
+
+    def __init__(self, collections, concurrency=2, client=None, progress=False):
+        # collections are (name, ImportConfig) pairs as returned by load_batch
+        self.collections = [(name, dataclasses.replace(config, progress=False)) for name, config in collections]
+        self.concurrency = max(1, min(concurrency, len(self.collections)))
+        self.client = client
+        self.owns_client = client is None
+        self.metrics = client.metrics if client is not None else Metrics()
+        self.progress = progress
+
+    def create_client(self):
+        config = self.collections[0][1]
+        # enough connections for the largest collections running side by side
+        connections = sorted((c.workers * max(1, c.upload_workers) for name, c in self.collections), reverse=True)
+        return ConfluenceClient(config.organization, config.user, config.api_key,
+                                max(config.pool_size, sum(connections[:self.concurrency])), config.timeout,
+                                RetryPolicy(config.max_retries), AdaptiveTokenBucket(config.max_rate),
+                                config.target_url, self.metrics)
+
+    def import_collection(self, job):
+        name, importer = job
+        config = importer.config
+        report = {'name': name, 'space_key': config.space_key, 'parent': config.parent}
+        logging.info('COLLECTION STARTED {} into space {} under {}'.format(name, config.space_key, config.parent))
+        try:
+            summary = importer.run()
+        except Exception as e:
+            logging.error('COLLECTION FAILED {}: {}'.format(name, repr(e)))
+            report['error'] = repr(e)
+            return report
+        for field in ('pages', 'failed', 'parse_seconds', 'upload_seconds', 'total_seconds'):
+            report[field] = summary[field]
+        logging.info('COLLECTION FINISHED {}: {} pages, {} failed in {:.2f}s'.format(
+            name, summary['pages'], summary['failed'], summary['total_seconds']))
+        return report
+
+    def run(self):
+        """Imports every collection and returns the aggregated statistics with one entry per collection."""
+        started = time.monotonic()
+        if self.client is None:
+            self.client = self.create_client()
+        # one planner per space, so collections sharing a space never plan the same title twice
+        planners = {}
+        jobs = []
+        reports = []
+        for name, config in self.collections:
+            try:
+                if config.space_key not in planners:
+                    existingTitles = self.client.list_page_titles(config.space_key)
+                    logging.info('FOUND {} existing page titles in space {}'.format(len(existingTitles),
+                                                                                    config.space_key))
+                    planners[config.space_key] = TitlePlanner(existingTitles)
+                # every collection registers the pages it owns before any of them assigns titles
+                importer = Importer(config, self.client, self.metrics, planners[config.space_key]).open()
+            except Exception as e:
+                logging.error('COLLECTION FAILED {}: {}'.format(name, repr(e)))
+                reports.append({'name': name, 'space_key': config.space_key, 'parent': config.parent,
+                                'error': repr(e)})
+                continue
+            jobs.append((name, importer))
+
+        progress = ProgressReporter(self.metrics).start() if self.progress else None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            reports.extend(executor.map(self.import_collection, jobs))
+        if progress is not None:
+            progress.stop()
+        if self.owns_client:
+            self.client.close()
+
+        failed = [report for report in reports if 'error' in report]
+        pages = sum(report.get('pages', 0) for report in reports)
+        logging.info('BATCH FINISHED {} collections ({} failed), {} pages in {:.2f}s'.format(
+            len(reports), len(failed), pages, time.monotonic() - started))
+        summary = self.metrics.summary()
+        summary.update({'collections': reports, 'pages': pages,
+                        'failed': sum(report.get('failed', 0) for report in reports),
+                        'failed_collections': len(failed), 'total_seconds': time.monotonic() - started})
+        return summary
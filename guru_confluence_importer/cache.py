@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .transform import TRANSFORM_VERSION
+from .transform import TransformResult
+
+
+class BodyCache:
+    """Converted storage-format bodies kept in SQLite across runs, least recently used evicted beyond max_bytes.
+
+    The export loader processes open their own BodyCache on the same file and only look bodies up; hits are marked
+    used and conversions stored by the importing process.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, transform_options=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        # the converter version and options are part of every key, so changing either never serves an old body
+        parser, aliases, asset_page = transform_options if transform_options is not None else ('html.parser', None,
+                                                                                               None)
+        options = [TRANSFORM_VERSION, parser, sorted((aliases or {}).items()), asset_page]
+        self.namespace = hashlib.sha256(json.dumps(options).encode('utf-8')).hexdigest()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stored = 0
+        self.connection = None
+        self.open()
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock:
+            # readers in the loader processes are not blocked by this process writing
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS bodies (key TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                                    'refs TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS bodies_used ON bodies (used)')
+            self.connection.commit()
+            self.total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+
+    def close(self):
+        if self.connection is None:
+            return
+        with self.lock:
+            entries, size = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM bodies').fetchone()
+            self.connection.close()
+            self.connection = None
+        logging.info('BODY CACHE {} hits, {} converted, {} entries ({} bytes) in {}'.format(
+            self.hits, self.stored, entries, size, self.path))
+
+    def key(self, html_hash):
+        return hashlib.sha256((self.namespace + ':' + html_hash).encode('utf-8')).hexdigest()
+
+    def lookup(self, key, title=""):
+        """Returns the cached TransformResult or None, without marking it used."""
+        with self.lock:
+            row = self.connection.execute('SELECT body, refs FROM bodies WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        result = TransformResult(title)
+        result.content = row[0]
+        result.images, result.attachments, result.links = json.loads(row[1])
+        return result
+
+    def touch(self, key):
+        with self.lock:
+            self.connection.execute('UPDATE bodies SET used = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+            self.hits = self.hits + 1
+
+    def get(self, key, title=""):
+        result = self.lookup(key, title)
+        if result is not None:
+            self.touch(key)
+        return result
+
+    def store(self, key, result):
+        refs = json.dumps([result.images, result.attachments, result.links])
+        size = len(result.content.encode('utf-8')) + len(refs)
+        with self.lock:
+            replaced = self.connection.execute('SELECT size FROM bodies WHERE key = ?', (key,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO bodies (key, body, refs, size, used) '
+                                    'VALUES (?, ?, ?, ?, ?)', (key, result.content, refs, size, time.time()))
+            self.connection.commit()
+            self.stored = self.stored + 1
+            self.total = self.total + size - (replaced[0] if replaced is not None else 0)
+            if self.total > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # other imports may share the file, so the total is read again before deciding what to drop
+        self.total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+        # evicting down to 90% keeps the next few stores from evicting again
+        excess = self.total - self.max_bytes * 0.9
+        if excess <= 0:
+            return
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM bodies ORDER BY used'):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess = excess - size
+            self.total = self.total - size
+        self.connection.executemany('DELETE FROM bodies WHERE key = ?', evicted)
+        self.connection.commit()
+        logging.info('BODY CACHE evicted {} entries'.format(len(evicted)))
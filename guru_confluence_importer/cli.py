@@ -0,0 +1,292 @@
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import re
+
+from .config import ImportConfig
+from .config import load_batch
+from .logs import LOG_FORMATS
+from .logs import configure_logging
+
+# logs, the default journal and the default manifest stay where the single-file script kept them
+LOG_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__))) + '/logs'
+LOG_PREFIX = LOG_DIR + '/guruCollectionToConfluence'
+
+
+def initiate_log(quiet, log_format='text', payload_chars=2000, sample_every=1):
+    logFile = LOG_PREFIX + '_log.log'
+    if not os.path.isdir(LOG_DIR):
+        os.mkdir(LOG_DIR)
+
+    configure_logging(logFile, quiet, log_format, payload_chars, sample_every)
+
+    logging.info('Starting...')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Import Guru collections to Atlassian Confluence.')
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument('--collection-dir', dest='collectiondir',
+                              help='directory where the collection file is located (default: none)')
+    source_group.add_argument('--collection-zip', dest='collectionzip',
+                              help='Guru export ZIP to read directly, without extracting it (default: none)')
+    source_group.add_argument('--batch', dest='batch',
+                              help='YAML file listing several collections with their space key and parent, imported '
+                                   'concurrently over one connection pool and request rate (default: none)')
+    parser.add_argument('--batch-workers', dest='batchworkers', type=int, default=2,
+                        help='number of --batch collections imported at the same time (default: 2)', required=False)
+    parser.add_argument('--user', dest='username', help='authorized user name (default: none)', required=True)
+    parser.add_argument('--api-key', dest='apikey', help='the api key for the authorized user (default: none)',
+                        required=False)
+    parser.add_argument('--space-key', dest='spacekey', help='the space key, per collection with --batch (default: '
+                                                             'none)', required=False)
+    parser.add_argument('--organization', dest='org', help='the atlassian organization (default: none)',
+                        required=False)
+    parser.add_argument('--target-url', dest='targeturl',
+                        help='Confluence base URL to use instead of https://<organization>.atlassian.net/wiki, e.g. a '
+                             'local stub (default: none)', required=False)
+    parser.add_argument('--dry-run', dest='dryrun', action='store_true', default=False,
+                        help='import into an in-process Confluence stub (guru_confluence_importer.stub) instead of '
+                             'a real site', required=False)
+    parser.add_argument('--stub-latency', dest='stublatency', type=float, default=0.0,
+                        help='seconds of latency added by the --dry-run stub to every response (default: 0)',
+                        required=False)
+    parser.add_argument('--stub-throttle-rate', dest='stubthrottlerate', type=float, default=0.0,
+                        help='fraction of requests the --dry-run stub answers with 429 (default: 0)', required=False)
+    parser.add_argument('--metrics-file', dest='metricsfile',
+                        help='write run statistics (pages, per-phase latency histograms, HTTP statuses, retries) as '
+                             'JSON to this file (default: none)', required=False)
+    parser.add_argument('--progress', dest='progress', action='store_true', default=False,
+                        help='show a live progress line with pages done, ETA and request rate on stderr',
+                        required=False)
+    parser.add_argument('--parent', dest='parent', help='the parent page for the import, per collection with --batch '
+                                                       '(default: none)', required=False)
+    parser.add_argument('--date-disclaimer', dest='datedisclaimer', help='[yes|no] add disclaimer and original update '
+                                                                         'date on the the top of each card (default: '
+                                                                         'none)', required=False)
+    parser.add_argument('--migrate-tags', dest='migratetags', help='[yes|no] migrate tags (as labels) if were exported',
+                        required=False)
+    parser.add_argument('--pool-size', dest='poolsize', type=int, default=10,
+                        help='number of pooled keep-alive connections to Confluence (default: 10)', required=False)
+    parser.add_argument('--timeout', dest='timeout', type=float, default=60,
+                        help='timeout in seconds for each Confluence request (default: 60)', required=False)
+    parser.add_argument('--workers', dest='workers', type=int, default=1,
+                        help='number of pages uploaded in parallel; sibling subtrees run concurrently once their '
+                             'parent exists. A --max-rate caps the requests of all workers together (default: 1)',
+                        required=False)
+    parser.add_argument('--max-retries', dest='maxretries', type=int, default=6,
+                        help='attempts per request on throttling (429) and transient (5xx, network) errors '
+                             '(default: 6)',
+                        required=False)
+    parser.add_argument('--max-rate', dest='maxrate', type=float, default=0,
+                        help='upper bound of requests per second, 0 for none; a rate is set and lowered automatically '
+                             'once Confluence throttles (default: 0)',
+                        required=False)
+    parser.add_argument('--journal', dest='journal',
+                        help='checkpoint journal recording every finished import step (default: logs/'
+                             'guruCollectionToConfluence_journal.jsonl)', required=False)
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='continue an interrupted import, skipping pages, labels and uploads already in the '
+                             'journal',
+                        required=False)
+    parser.add_argument('--manifest', dest='manifest',
+                        help='state of the last import (page IDs, versions, card hashes) read by --sync and '
+                             'rewritten at the end of every run '
+                             '(default: logs/guruCollectionToConfluence_manifest.json)',
+                        required=False)
+    parser.add_argument('--sync', action='store_true', default=False,
+                        help='re-sync a previously imported collection: create new cards, update changed ones and skip '
+                             'unchanged ones', required=False)
+    parser.add_argument('--html-parser', dest='htmlparser', choices=['html.parser', 'lxml'], default='html.parser',
+                        help='BeautifulSoup parser used to convert card HTML; lxml is faster if installed '
+                             '(default: html.parser)', required=False)
+    parser.add_argument('--labels-mode', dest='labelsmode', choices=['separate', 'inline', 'deferred'],
+                        default='separate', help='separate: one label request after each page is created; inline: '
+                                                 'send labels with the page creation; deferred: label all pages '
+                                                 'concurrently after every page exists (default: separate)',
+                        required=False)
+    parser.add_argument('--single-write', dest='singlewrite', action='store_true', default=False,
+                        help='create pages with their final body and skip the second update unless Confluence dropped '
+                             'attachment references', required=False)
+    parser.add_argument('--attachment-strategy', dest='attachmentstrategy', choices=['page', 'dedup', 'shared'],
+                        default='page', help='page: upload every referenced file to each page; dedup: upload identical '
+                                             'files once per page; shared: upload each distinct file once to a shared '
+                                             'assets page and reference it from there (default: page)', required=False)
+    parser.add_argument('--assets-title', dest='assetstitle', default='Guru import assets',
+                        help='title of the shared assets page used by --attachment-strategy shared '
+                             '(default: Guru import assets)', required=False)
+    parser.add_argument('--upload-batch-files', dest='uploadbatchfiles', type=int, default=10,
+                        help='maximum number of files sent in one attachment upload request (default: 10)',
+                        required=False)
+    parser.add_argument('--upload-batch-mb', dest='uploadbatchmb', type=float, default=50,
+                        help='maximum megabytes sent in one attachment upload request; larger files go alone '
+                             '(default: 50)', required=False)
+    parser.add_argument('--upload-workers', dest='uploadworkers', type=int, default=1,
+                        help='number of attachment batches of one page uploaded in parallel, for each of the '
+                             '--workers pages (default: 1)',
+                        required=False)
+    parser.add_argument('--parse-workers', dest='parseworkers', type=int, default=None,
+                        help='number of processes parsing and converting the export (default: number of CPUs)',
+                        required=False)
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help='upload while the collection is read instead of parsing the whole export first; card '
+                             'bodies are loaded right before their upload and memory stays flat', required=False)
+    parser.add_argument('--queue-size', dest='queuesize', type=int, default=100,
+                        help='pages read ahead of the uploaders in --stream mode (default: 100)', required=False)
+    parser.add_argument('--plan', dest='plan',
+                        help='parse and convert the export into this JSON lines plan file (one record per page with '
+                             'its parent, title, labels, files and body) and report the requests, bytes and time the '
+                             'import will take at --max-rate, without contacting Confluence (default: none)',
+                        required=False)
+    parser.add_argument('--execute-plan', dest='executeplan',
+                        help='import a plan written by --plan instead of parsing the export again; the export is '
+                             'only read for the attachment files (default: none)', required=False)
+    parser.add_argument('--body-cache', dest='bodycache',
+                        help='SQLite file caching converted card bodies between runs, so unchanged cards are not '
+                             'converted again (default: no cache)', required=False)
+    parser.add_argument('--body-cache-mb', dest='bodycachemb', type=int, default=256,
+                        help='size limit of --body-cache in megabytes, least recently used bodies are evicted '
+                             '(default: 256)', required=False)
+    parser.add_argument('--optimize-images', dest='optimizeimages', action='store_true', default=False,
+                        help='recompress PNGs losslessly and downsize images larger than --image-max-dimension before '
+                             'uploading them; requires Pillow', required=False)
+    parser.add_argument('--image-cache', dest='imagecache',
+                        help='directory caching optimized images by content hash between runs (default: logs/'
+                             'guruCollectionToConfluence_image_cache)', required=False)
+    parser.add_argument('--image-min-kb', dest='imageminkb', type=int, default=256,
+                        help='only images of at least this many kilobytes are optimized (default: 256)',
+                        required=False)
+    parser.add_argument('--image-max-dimension', dest='imagemaxdimension', type=int, default=0,
+                        help='downsize images whose width or height exceeds this many pixels, 0 keeps the size '
+                             '(default: 0)', required=False)
+    parser.add_argument('--image-quality', dest='imagequality', type=int, default=85,
+                        help='JPEG quality used when a JPEG is downsized (default: 85)', required=False)
+    parser.add_argument('--image-workers', dest='imageworkers', type=int, default=None,
+                        help='number of processes optimizing images (default: number of CPUs)', required=False)
+    parser.add_argument('--validate-only', dest='validateonly', action='store_true', default=False,
+                        help='check the options and the collection location, then exit without importing',
+                        required=False)
+    parser.add_argument('--log-format', dest='logformat', choices=LOG_FORMATS, default='text',
+                        help='text: the classic log lines; json: one JSON object per line with the page key, Guru ID '
+                             'and page ID as fields (default: text)', required=False)
+    parser.add_argument('--log-payload-chars', dest='logpayloadchars', type=int, default=2000,
+                        help='characters of a failed request body or API response written to the log, 0 writes them '
+                             'whole (default: 2000)', required=False)
+    parser.add_argument('--log-sample', dest='logsample', type=int, default=1,
+                        help='log only every n-th upload and image event of each kind, warnings and errors are always '
+                             'logged (default: 1)', required=False)
+    parser.add_argument('--quiet', action='store_true', help='No output on stdout',
+                        required=False, default=False)
+    return parser
+
+
+def config_from_args(args):
+    return ImportConfig(
+        space_key=args.spacekey, parent=args.parent, user=args.username, api_key=args.apikey,
+        collection_dir=args.collectiondir, collection_zip=args.collectionzip, organization=args.org,
+        target_url=args.targeturl,
+        date_disclaimer=args.datedisclaimer is not None and args.datedisclaimer.lower() == 'yes',
+        migrate_tags=args.migratetags is not None and args.migratetags.lower() == 'yes',
+        pool_size=args.poolsize, timeout=args.timeout, workers=args.workers, max_retries=args.maxretries,
+        max_rate=args.maxrate, journal=args.journal or LOG_PREFIX + '_journal.jsonl', resume=args.resume,
+        manifest=args.manifest or LOG_PREFIX + '_manifest.json', sync=args.sync, html_parser=args.htmlparser,
+        labels_mode=args.labelsmode, single_write=args.singlewrite, attachment_strategy=args.attachmentstrategy,
+        assets_title=args.assetstitle, upload_batch_files=args.uploadbatchfiles, upload_batch_mb=args.uploadbatchmb,
+        upload_workers=args.uploadworkers, parse_workers=args.parseworkers, stream=args.stream,
+        queue_size=args.queuesize, progress=args.progress, plan=args.plan, execute_plan=args.executeplan,
+        optimize_images=args.optimizeimages,
+        image_cache=args.imagecache or LOG_PREFIX + '_image_cache', image_min_kb=args.imageminkb,
+        image_max_dimension=args.imagemaxdimension, image_quality=args.imagequality, image_workers=args.imageworkers,
+        body_cache=args.bodycache, body_cache_mb=args.bodycachemb)
+
+
+def log_summary(summary):
+    for phase, stats in sorted(summary['phases'].items()):
+        logging.info('METRICS {}: {} calls, {:.2f}s total, {:.3f}s mean, {:.3f}s max, {} errors, {} bytes'.format(
+            phase, stats['count'], stats['seconds'], stats['mean_seconds'], stats['max_seconds'], stats['errors'],
+            stats['bytes']))
+    logging.info('METRICS http: {} requests, {} bytes sent, statuses {}, retries {}'.format(
+        summary['http']['requests'], summary['http']['bytes_sent'], json.dumps(summary['http']['statuses']),
+        json.dumps(summary['http']['retries'])))
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # compiling a plan never contacts Confluence
+    offline = args.dryrun or args.plan is not None
+    if args.org is None and args.targeturl is None and not offline:
+        parser.error('one of --organization, --target-url or --dry-run is required')
+    config = config_from_args(args)
+    collections = None
+    if args.batch is not None:
+        if args.journal is not None or args.manifest is not None:
+            parser.error('--journal and --manifest are set per collection in the --batch file')
+        if args.plan is not None or args.executeplan is not None:
+            parser.error('--plan and --execute-plan are set per collection in the --batch file')
+        try:
+            collections = load_batch(args.batch, dataclasses.replace(config, journal=None, manifest=None), LOG_PREFIX)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        errors = []
+        for name, collection in collections:
+            errors.extend('{}: {}'.format(name, error) for error in collection.validate(require_target=not offline))
+            if collection.space_key is None or collection.parent is None:
+                errors.append('{}: space_key and parent are required'.format(name))
+    else:
+        if args.spacekey is None or args.parent is None:
+            parser.error('--space-key and --parent are required')
+        errors = config.validate(require_target=not offline)
+    if args.logsample < 1:
+        errors.append('--log-sample must be at least 1')
+    if args.htmlparser == 'lxml':
+        try:
+            import lxml
+        except ImportError:
+            errors.append('--html-parser lxml requires the lxml package (pip install lxml)')
+    if args.optimizeimages:
+        try:
+            import PIL
+        except ImportError:
+            errors.append('--optimize-images requires the Pillow package (pip install Pillow)')
+    if len(errors) > 0:
+        parser.error('; '.join(errors))
+    if args.validateonly:
+        print('Configuration OK')
+        return
+
+    initiate_log(args.quiet, args.logformat, args.logpayloadchars, args.logsample)
+
+    # Regular expression pattern to find the apikey value
+    pattern = r"(apikey=')\w+(')"
+    # Replace the value of apikey with "**********"
+    sanitized_arguments = re.sub(pattern, r"\1**********\2", 'Arguments {}'.format(args))
+    logging.info(sanitized_arguments)
+
+    stub = None
+    if args.dryrun:
+        from .stub import ConfluenceStub
+        stub = ConfluenceStub(latency=args.stublatency, throttle_rate=args.stubthrottlerate).start()
+        config.target_url = stub.url
+        for name, collection in collections or []:
+            collection.target_url = stub.url
+        logging.info('DRY RUN against local stub ' + stub.url)
+    # the HTTP, HTML and YAML libraries are only loaded once there is an import to run
+    if args.plan is not None:
+        from .importer import Importer
+        summary = Importer(config).compile_plan(args.plan)
+    elif collections is not None:
+        from .batch import BatchImporter
+        summary = BatchImporter(collections, args.batchworkers, progress=args.progress).run()
+    else:
+        from .importer import Importer
+        summary = Importer(config).run()
+    if stub is not None:
+        logging.info('DRY RUN stub statistics ' + json.dumps(stub.stats()))
+        stub.stop()
+    log_summary(summary)
+    if args.metricsfile is not None:
+        with open(args.metricsfile, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,459 @@
+import collections
+import datetime
+import email.utils
+import json
+import logging
+import mimetypes
+import threading
+import time
+import uuid
+
+import requests
+
+from random import uniform
+from requests.adapters import HTTPAdapter
+from urllib3.fields import format_multipart_header_param
+
+from .metrics import Metrics
+
+
+THROTTLE = 'throttle'
+TRANSIENT = 'transient'
+DUPLICATE_TITLE = 'duplicate-title'
+PERMANENT = 'permanent'
+
+
+class ConfluenceError(Exception):
+    def __init__(self, category, status_code, message):
+        super().__init__('{} error ({}): {}'.format(category, status_code, message))
+        self.category = category
+        self.status_code = status_code
+
+
+class DuplicateTitleError(ConfluenceError):
+    pass
+
+
+def classify_response(response):
+    """Returns None for a successful response, otherwise one of the error categories."""
+    if response.ok:
+        return None
+    if response.status_code == 429:
+        return THROTTLE
+    if response.status_code == 503 and 'Retry-After' in response.headers:
+        return THROTTLE
+    if response.status_code >= 500 or response.status_code == 408:
+        return TRANSIENT
+    if response.status_code == 400 and \
+            'a page already exists with the same title in this space' in response.text.lower():
+        return DUPLICATE_TITLE
+    return PERMANENT
+
+
+def is_child_of(page, parent):
+    """True when a page fetched with its ancestors expanded sits directly below the parent page ID."""
+    ancestors = page.get('ancestors') or []
+    return len(ancestors) > 0 and str(ancestors[-1]['id']) == str(parent)
+
+
+def parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for throttled and transient failures, honoring Retry-After."""
+
+    def __init__(self, max_attempts=6, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, category, attempt):
+        return category in (THROTTLE, TRANSIENT) and attempt < self.max_attempts
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay) + uniform(0, self.base_delay)
+        return uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class AdaptiveTokenBucket:
+    """Token bucket and in-flight limit shared by all workers, both decreased when Confluence throttles.
+
+    With max_rate 0 requests are not limited until Confluence first throttles; the rate then starts from half the
+    rate observed over the last requests. One throttling episode usually answers several concurrent requests with 429,
+    so the rate and the concurrency are halved once per episode: further throttles are ignored until the throttled
+    request's duration or its Retry-After has passed. The rate recovers in proportion to itself, the concurrency by
+    one per window of successes.
+    """
+
+    def __init__(self, max_rate=0.0, min_rate=0.5, recovery=0.02):
+        self.max_rate = max_rate if max_rate > 0 else float('inf')
+        self.min_rate = min_rate
+        self.recovery = recovery
+        # None: not limited (yet)
+        self.rate = max_rate if max_rate > 0 else None
+        self.tokens = self.rate or 0.0
+        self.updated = time.monotonic()
+        self.hold_until = 0.0
+        # start times of the last requests, to know the rate reached before the first throttle
+        self.started = collections.deque(maxlen=100)
+        # requests in flight, and their limit once throttled (None: as many as the workers send)
+        self.in_flight = 0
+        self.concurrency = None
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Waits for a free request slot and a token; every acquire is followed by one release."""
+        while True:
+            with self.condition:
+                while self.concurrency is not None and self.in_flight >= self.concurrency:
+                    self.condition.wait()
+                now = time.monotonic()
+                if self.rate is None:
+                    self.started.append(now)
+                    self.in_flight = self.in_flight + 1
+                    return
+                self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    self.in_flight = self.in_flight + 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def observed_rate(self, now):
+        if len(self.started) < 2 or now <= self.started[0]:
+            return self.min_rate * 2
+        return len(self.started) / (now - self.started[0])
+
+    def release(self):
+        with self.condition:
+            self.in_flight = self.in_flight - 1
+            self.condition.notify()
+
+    def on_success(self):
+        with self.condition:
+            if self.rate is not None:
+                self.rate = min(self.max_rate, max(self.rate * (1 + self.recovery), self.rate + 0.01))
+            if self.concurrency is not None:
+                self.successes = self.successes + 1
+                if self.successes >= self.concurrency:
+                    self.successes = 0
+                    self.concurrency = self.concurrency + 1
+                    self.condition.notify()
+
+    def on_throttle(self, hold=0.0):
+        """Decreases rate and concurrency, unless the throttle belongs to the episode that decreased them last."""
+        with self.condition:
+            now = time.monotonic()
+            if now < self.hold_until:
+                return
+            self.hold_until = now + hold
+            if self.rate is None:
+                self.rate = self.observed_rate(now)
+                self.updated = now
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            self.concurrency = max(1, (self.concurrency if self.concurrency is not None else self.in_flight + 1) // 2)
+            self.successes = 0
+            logging.warning('THROTTLED - request rate lowered to {:.2f}/s, {} concurrent requests'.format(
+                self.rate, self.concurrency))
+
+
+class MultipartFileStream:
+    """multipart/form-data body read from the export chunk by chunk, with a known length so no file is held in memory."""
+
+    def __init__(self, files, source, field_name='file', on_file_sent=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+        self.source = source
+        self.on_file_sent = on_file_sent
+        self.segments = []
+        for file_name, file_path in files:
+            content_type, encoding = mimetypes.guess_type(file_path)
+            if content_type is None:
+                content_type = 'multipart/form-data'
+            header = '--{}\r\nContent-Disposition: form-data; {}; {}\r\nContent-Type: {}\r\n\r\n'.format(
+                self.boundary, format_multipart_header_param('name', field_name),
+                format_multipart_header_param('filename', file_name), content_type)
+            self.segments.append(header.encode('utf-8'))
+            self.segments.append((file_name, file_path, source.size(file_path)))
+            self.segments.append(b'\r\n')
+        self.segments.append('--{}--\r\n'.format(self.boundary).encode('utf-8'))
+        self.length = sum(len(segment) if isinstance(segment, bytes) else segment[2] for segment in self.segments)
+        self.seek(0)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(64 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+    def seek(self, offset):
+        # only rewinding is supported, which is what a retried request needs
+        self.close()
+        self.position = 0
+        self.current = None
+        self.started = None
+
+    def close(self):
+        current = getattr(self, 'current', None)
+        if current is not None:
+            current.close()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        chunks = []
+        remaining = size
+        while remaining > 0 and self.position < len(self.segments):
+            segment = self.segments[self.position]
+            if isinstance(segment, bytes):
+                # part headers are tiny, they may exceed the requested size slightly
+                chunks.append(segment)
+                remaining = remaining - len(segment)
+                self.position = self.position + 1
+                continue
+            if self.current is None:
+                self.current = self.source.open(segment[1])
+                self.started = time.monotonic()
+            chunk = self.current.read(remaining)
+            if chunk:
+                chunks.append(chunk)
+                remaining = remaining - len(chunk)
+                continue
+            self.current.close()
+            self.current = None
+            if self.on_file_sent is not None:
+                self.on_file_sent(segment[0], segment[2], time.monotonic() - self.started)
+            self.position = self.position + 1
+        return b''.join(chunks)
+
+
+class ConfluenceClient:
+    """Owns one pooled, keep-alive HTTP session shared by every Confluence REST call."""
+
+    def __init__(self, organization, user_name, user_credentials, pool_size=10, timeout=60, retry_policy=None,
+                 rate_limiter=None, base_url=None, metrics=None):
+        if base_url is None:
+            base_url = "https://" + organization + ".atlassian.net/wiki"
+        self.base_url = base_url.rstrip('/') + "/rest/api"
+        self.timeout = timeout
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else AdaptiveTokenBucket()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.session = requests.Session()
+        self.session.auth = (user_name, user_credentials)
+        self.session.headers.update({'Connection': 'keep-alive'})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, url, retried=None, **kwargs):
+        # retried, when given, collects the category of every failed attempt that was sent again
+        attempt = 0
+        while True:
+            attempt = attempt + 1
+            if hasattr(kwargs.get('data'), 'seek'):
+                kwargs['data'].seek(0)
+            with self.metrics.phase('rate_limit_wait'):
+                self.rate_limiter.acquire()
+            size = len(kwargs['data']) if kwargs.get('data') is not None else 0
+            started = time.monotonic()
+            error = None
+            try:
+                raw_response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                # the slot is free again before any backoff sleep below
+                self.rate_limiter.release()
+            if error is not None:
+                self.metrics.record_request('network error', size)
+                if not self.retry_policy.should_retry(TRANSIENT, attempt):
+                    raise ConfluenceError(TRANSIENT, None, repr(error))
+                delay = self.retry_policy.delay(attempt)
+                self.metrics.record_retry(TRANSIENT, delay)
+                if retried is not None:
+                    retried.append(TRANSIENT)
+                logging.warning('RETRY {} {} after {} (attempt {}, waiting {:.1f}s)'.format(method, url, repr(error),
+                                                                                           attempt, delay))
+                time.sleep(delay)
+                continue
+
+            self.metrics.record_request(raw_response.status_code, size)
+            category = classify_response(raw_response)
+            if category is None:
+                self.rate_limiter.on_success()
+                return raw_response
+            retry_after = parse_retry_after(raw_response.headers.get('Retry-After'))
+            if category == THROTTLE:
+                # 429s of requests sent before this one came back belong to the same episode
+                self.rate_limiter.on_throttle(max(time.monotonic() - started, retry_after or 0.0))
+            if not self.retry_policy.should_retry(category, attempt):
+                return raw_response
+            delay = self.retry_policy.delay(attempt, retry_after)
+            self.metrics.record_retry(category, delay)
+            if retried is not None:
+                retried.append(category)
+            logging.warning('RETRY {} {} after {} {} (attempt {}, waiting {:.1f}s)'.format(
+                method, url, category, raw_response.status_code, attempt, delay))
+            time.sleep(delay)
+
+    def _check(self, raw_response, operation, data):
+        category = classify_response(raw_response)
+        if category is None:
+            return raw_response.json()
+        if category == DUPLICATE_TITLE:
+            logging.warning('DUPLICATE TITLE - {}'.format(data['title']))
+            raise DuplicateTitleError(category, raw_response.status_code, raw_response.text)
+        logging.error("ERROR from API " + operation + " request: " + str(raw_response.status_code) + " (" +
+                      category + ")")
+        # the page body alone can be megabytes, so these are cut to --log-payload-chars
+        logging.error("ERROR data: %s", data, extra={'payload': True})
+        logging.error("ERROR response: %s", raw_response.text, extra={'payload': True})
+        raise ConfluenceError(category, raw_response.status_code, raw_response.text)
+
+    def create_confluence_page(self, space, parent, title, content, expand=None, labels=None):
+        url = self.base_url + "/content"
+        if expand is not None:
+            url = url + "?expand=" + expand
+        data = {
+            "title": title,
+            "type": "page",
+            "space": {
+                "key": space
+            },
+            "status": "current",
+            "ancestors": [
+                {
+                    "id": parent
+                }
+            ],
+            "body": {
+                "storage": {
+                    "value": content,
+                    "representation": "storage"
+                }
+            },
+            "metadata": {
+                "properties": {
+                    "editor": {
+                        "value": "v2"
+                    }
+                }
+            }
+        }
+        if labels is not None:
+            data["metadata"]["labels"] = labels
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        body = json.dumps(data)
+        with self.metrics.phase('page_create', len(body)):
+            retried = []
+            raw_response = self._request('POST', url, retried=retried, data=body, headers=headers)
+            if TRANSIENT in retried and classify_response(raw_response) == DUPLICATE_TITLE:
+                # creating is not idempotent: the attempt that timed out or failed may have created the page
+                existing = self.find_page(space, title, 'ancestors,version' + (',' + expand if expand else ''))
+                if existing is not None and is_child_of(existing, parent):
+                    logging.warning('ADOPTED {} "{}", created by a request that failed'.format(existing['id'], title))
+                    return existing
+            return self._check(raw_response, 'create', data)
+
+    def find_page(self, space, title, expand=None):
+        """Returns the current page with this title in the space, or None."""
+        params = {'spaceKey': space, 'title': title, 'type': 'page', 'status': 'current'}
+        if expand is not None:
+            params['expand'] = expand
+        headers = {'Accept': 'application/json'}
+        raw_response = self._request('GET', self.base_url + "/content", params=params, headers=headers)
+        results = self._check(raw_response, 'find', {'space': space, 'title': title})['results']
+        return results[0] if len(results) > 0 else None
+
+    def update_confluence_page(self, space, page_id, title, content, version=2):
+        url = self.base_url + "/content/" + page_id
+        data = {
+            "id": page_id,
+            "title": title,
+            "type": "page",
+            "space": {
+                "key": space
+            },
+            "status": "current",
+            "body": {
+                "storage": {
+                    "value": content,
+                    "representation": "storage"
+                }
+            },
+            "version": {
+                "number": version
+            }
+        }
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        body = json.dumps(data)
+        with self.metrics.phase('page_update', len(body)):
+            raw_response = self._request('PUT', url, data=body, headers=headers)
+            return self._check(raw_response, 'update', data)
+
+    def list_page_titles(self, space, limit=200):
+        """Returns {title: page ID} of every current page in the space, following the paged content listing."""
+        titles = {}
+        url = self.base_url + "/content?spaceKey=" + space + "&type=page&status=current&limit=" + str(limit)
+        headers = {'Accept': 'application/json'}
+        while url is not None:
+            with self.metrics.phase('title_listing'):
+                raw_response = self._request('GET', url, headers=headers)
+                listing = self._check(raw_response, 'list', {'space': space})
+            for page in listing['results']:
+                titles[page['title']] = page['id']
+            next_link = listing.get('_links', {}).get('next')
+            # next links are relative to the site, i.e. the part of the base URL before /rest/api
+            url = self.base_url[:-len("/rest/api")] + next_link if next_link else None
+        return titles
+
+    def update_confluence_page_labels(self, page_id, labelsMetadata):
+        url = self.base_url + "/content/" + page_id + "/label"
+        data = labelsMetadata
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        body = json.dumps(data)
+        with self.metrics.phase('label_update', len(body)):
+            raw_response = self._request('POST', url, data=body, headers=headers)
+            return self._check(raw_response, 'label', body)
+
+    def upload_attachments_for_confluence_page(self, page_id, file_names, source, resource_dir='resources',
+                                               on_file_sent=None):
+        """Uploads several files in one streamed multipart request; files missing in the export are left out."""
+        url = self.base_url + "/content/" + page_id + "/child/attachment"
+        files = [(file_name, resource_dir + "/" + file_name) for file_name in file_names]
+        files = [(file_name, file_path) for file_name, file_path in files if source.is_file(file_path)]
+        if len(files) == 0:
+            return None
+
+        stream = MultipartFileStream(files, source, on_file_sent=on_file_sent)
+        headers = {"X-Atlassian-Token": "nocheck", "Content-Type": stream.content_type}
+        try:
+            with self.metrics.phase('attachment_upload', len(stream)):
+                raw_response = self._request('POST', url, data=stream, headers=headers)
+                return self._check(raw_response, 'upload', ", ".join(file_name for file_name, file_path in files))
+        finally:
+            stream.close()
@@ -0,0 +1,154 @@
+import dataclasses
+import os
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+HTML_PARSERS = ('html.parser', 'lxml')
+LABELS_MODES = ('separate', 'inline', 'deferred')
+ATTACHMENT_STRATEGIES = ('page', 'dedup', 'shared')
+
+# one client serves every collection of a batch, so these are set once for the whole batch
+CONNECTION_FIELDS = ('user', 'api_key', 'organization', 'target_url', 'pool_size', 'timeout', 'max_retries',
+                     'max_rate')
+# resolved against the directory of the batch file when relative
+PATH_FIELDS = ('collection_dir', 'collection_zip', 'journal', 'manifest', 'image_cache', 'plan', 'execute_plan',
+               'body_cache')
+
+
+@dataclass
+class ImportConfig:
+    """Everything one import needs; the command line options map one to one onto these fields."""
+
+    space_key: str
+    parent: str
+    user: str
+    api_key: Optional[str] = None
+    collection_dir: Optional[str] = None
+    collection_zip: Optional[str] = None
+    organization: Optional[str] = None
+    target_url: Optional[str] = None
+    date_disclaimer: bool = False
+    migrate_tags: bool = False
+    pool_size: int = 10
+    timeout: int = 60
+    workers: int = 1
+    max_retries: int = 6
+    max_rate: float = 0.0
+    journal: Optional[str] = None
+    resume: bool = False
+    manifest: Optional[str] = None
+    sync: bool = False
+    html_parser: str = 'html.parser'
+    labels_mode: str = 'separate'
+    single_write: bool = False
+    attachment_strategy: str = 'page'
+    assets_title: str = 'Guru import assets'
+    upload_batch_files: int = 10
+    upload_batch_mb: int = 50
+    upload_workers: int = 1
+    parse_workers: Optional[int] = None
+    stream: bool = False
+    queue_size: int = 100
+    progress: bool = False
+    plan: Optional[str] = None
+    execute_plan: Optional[str] = None
+    optimize_images: bool = False
+    image_cache: Optional[str] = None
+    image_min_kb: int = 256
+    image_max_dimension: int = 0
+    image_quality: int = 85
+    image_workers: Optional[int] = None
+    body_cache: Optional[str] = None
+    body_cache_mb: int = 256
+    # journal and manifest keys start with it; batch imports give every collection its own
+    root_key: str = '00000000-0000-0000-0000-000000000000'
+
+    def validate(self, require_target=True):
+        """Returns the configuration errors, without touching the network or importing the export libraries."""
+        errors = []
+        if (self.collection_dir is None) == (self.collection_zip is None):
+            errors.append('exactly one of collection_dir or collection_zip is required')
+        elif self.collection_dir is not None and not os.path.isfile(self.collection_dir + '/collection.yaml'):
+            errors.append('no collection.yaml found in ' + self.collection_dir)
+        elif self.collection_zip is not None and not os.path.isfile(self.collection_zip):
+            errors.append('no such file ' + self.collection_zip)
+        if require_target and self.organization is None and self.target_url is None:
+            errors.append('one of organization or target_url is required')
+        if self.html_parser not in HTML_PARSERS:
+            errors.append('html_parser must be one of ' + ', '.join(HTML_PARSERS))
+        if self.labels_mode not in LABELS_MODES:
+            errors.append('labels_mode must be one of ' + ', '.join(LABELS_MODES))
+        if self.attachment_strategy not in ATTACHMENT_STRATEGIES:
+            errors.append('attachment_strategy must be one of ' + ', '.join(ATTACHMENT_STRATEGIES))
+        if self.resume and self.journal is None:
+            errors.append('resume requires a journal')
+        if self.optimize_images and self.image_cache is None:
+            errors.append('optimize_images requires an image_cache directory')
+        if not 1 <= self.image_quality <= 95:
+            errors.append('image_quality must be between 1 and 95')
+        if self.body_cache_mb < 1:
+            errors.append('body_cache_mb must be at least 1')
+        if self.plan is not None and self.execute_plan is not None:
+            errors.append('plan and execute_plan cannot be combined')
+        if self.stream and (self.plan is not None or self.execute_plan is not None):
+            errors.append('stream cannot be combined with plan or execute_plan')
+        if self.execute_plan is not None and not os.path.isfile(self.execute_plan):
+            errors.append('no such file ' + self.execute_plan)
+        if self.sync and self.manifest is None:
+            errors.append('sync requires a manifest')
+        for name in ('workers', 'pool_size', 'upload_workers', 'upload_batch_files', 'queue_size', 'max_retries'):
+            if getattr(self, name) < 1:
+                errors.append(name + ' must be at least 1')
+        return errors
+
+
+def load_batch(path, base, log_prefix=None):
+    """Reads a batch file and returns (name, ImportConfig) for every collection it lists.
+
+    The file is YAML (or JSON) with an optional ``defaults`` mapping and a ``collections`` list; both hold
+    ImportConfig fields and override the fields of base. Collections without their own journal or manifest get
+    ``<log_prefix>_<name>_journal.jsonl`` and ``<log_prefix>_<name>_manifest.json``.
+    """
+    # only batch runs need PyYAML before the import starts
+    import yaml
+
+    with open(path, 'r', encoding='utf-8') as f:
+        content = yaml.safe_load(f) or {}
+    fields = {field.name for field in dataclasses.fields(ImportConfig)}
+    defaults = content.get('defaults') or {}
+    collections = []
+    names = set()
+    for position, entry in enumerate(content.get('collections') or []):
+        values = dict(defaults)
+        values.update(entry)
+        name = values.pop('name', None)
+        if name is None:
+            location = values.get('collection_dir') or values.get('collection_zip') or str(position + 1)
+            name = os.path.splitext(os.path.basename(location.rstrip('/')))[0]
+        if name in names:
+            raise ValueError('batch file {}: collection name "{}" is used twice'.format(path, name))
+        names.add(name)
+        unknown = sorted(set(values) - fields)
+        if len(unknown) > 0:
+            raise ValueError('batch file {}: unknown fields {} in collection "{}"'.format(path, ', '.join(unknown),
+                                                                                           name))
+        shared = sorted(set(values) & set(CONNECTION_FIELDS))
+        if len(shared) > 0:
+            raise ValueError('batch file {}: {} apply to the whole batch and cannot be set per collection'.format(
+                path, ', '.join(shared)))
+        for field in PATH_FIELDS:
+            if values.get(field) is not None:
+                values[field] = os.path.join(os.path.dirname(os.path.abspath(path)), values[field])
+        config = dataclasses.replace(base, **values)
+        # keys stay unique when collections share a space and its title planner
+        config.root_key = base.root_key + '/' + name
+        if log_prefix is not None and config.journal is None:
+            config.journal = log_prefix + '_' + name + '_journal.jsonl'
+        if log_prefix is not None and config.manifest is None:
+            config.manifest = log_prefix + '_' + name + '_manifest.json'
+        collections.append((name, config))
+    if len(collections) == 0:
+        raise ValueError('batch file {} lists no collections'.format(path))
+    return collections
@@ -0,0 +1,397 @@
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+import zlib
+
+import yaml
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .cache import BodyCache
+from .metrics import Metrics
+from .pages import ConfluencePage
+from .pages import normalize_title
+from .transform import transform_html
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+
+class DirectorySource:
+    """An extracted Guru export, file names are relative to the collection directory."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name):
+        return self.root + "/" + name
+
+    def is_file(self, name):
+        return Path(self.path(name)).is_file()
+
+    def size(self, name):
+        return os.path.getsize(self.path(name))
+
+    def open(self, name):
+        return open(self.path(name), "rb")
+
+    def read_text(self, name):
+        with open(self.path(name), "r") as f:
+            return f.read()
+
+    def list(self, directory):
+        if not os.path.isdir(self.path(directory)):
+            return []
+        return [entry.name for entry in os.scandir(self.path(directory)) if entry.is_file()]
+
+
+class ZipSource:
+    """A Guru export read straight from its ZIP archive through a name index of the central directory."""
+
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self.archive = None
+        self.lock = threading.Lock()
+        self.owner = os.getpid()
+        self.entries = {}
+        self.directories = {}
+        with zipfile.ZipFile(zip_path) as archive:
+            infos = [info for info in archive.infolist() if not info.is_dir()]
+        # the collection may sit in a top level folder of the archive
+        roots = sorted((info.filename.replace("\\", "/")[:-len("collection.yaml")] for info in infos
+                        if info.filename.replace("\\", "/").split("/")[-1] == "collection.yaml"), key=len)
+        prefix = roots[0] if len(roots) > 0 else ""
+        for info in infos:
+            name = info.filename.replace("\\", "/")
+            if not name.startswith(prefix):
+                continue
+            name = name[len(prefix):]
+            self.entries[name] = info
+            directory, _, file_name = name.rpartition("/")
+            self.directories.setdefault(directory, []).append(file_name)
+        logging.info('INDEXED {} files in {}'.format(len(self.entries), zip_path))
+
+    def __getstate__(self):
+        # worker processes open their own handle of the archive
+        state = dict(self.__dict__)
+        state['archive'] = None
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.owner = os.getpid()
+
+    def info(self, name):
+        info = self.entries.get(name)
+        if info is None:
+            raise FileNotFoundError('{} not found in {}'.format(name, self.zip_path))
+        return info
+
+    def is_file(self, name):
+        return name in self.entries
+
+    def size(self, name):
+        return self.info(name).file_size
+
+    def open(self, name):
+        info = self.info(name)
+        if self.owner != os.getpid():
+            # a forked worker inherits the parent's handle and its file offset, reading it would race the parent
+            self.archive = None
+            self.lock = threading.Lock()
+            self.owner = os.getpid()
+        with self.lock:
+            if self.archive is None:
+                self.archive = zipfile.ZipFile(self.zip_path)
+        # members are decompressed while they are read, ZipFile serializes reads of its shared handle
+        return self.archive.open(info)
+
+    def read_text(self, name):
+        with io.TextIOWrapper(self.open(name)) as f:
+            return f.read()
+
+    def list(self, directory):
+        return list(self.directories.get(directory, []))
+
+
+def load_yaml(source, name):
+    with source.open(name) as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+# export source, transform options and body cache of the current loader process, set once per worker by
+# init_export_worker
+export_source = None
+export_transform_options = None
+export_body_cache = None
+
+
+def init_export_worker(source, transform_options, body_cache_path=None):
+    global export_source, export_transform_options, export_body_cache
+    export_source = source
+    export_transform_options = transform_options
+    if body_cache_path is not None:
+        export_body_cache = BodyCache(body_cache_path, transform_options=transform_options)
+
+
+def parse_export_file(job):
+    """Process pool task: parses one export YAML file, and for cards also reads and converts the HTML body."""
+    kind, item_id = job
+    document = None
+    error = None
+    html_hash = None
+    html = None
+    rendered = None
+    cached = False
+    # measured here and recorded by the parent process, worker processes do not share the metrics object
+    timings = []
+    try:
+        started = time.monotonic()
+        document = load_yaml(export_source, kind + "/" + item_id + ".yaml")
+        timings.append(('yaml_load', time.monotonic() - started, 0))
+        if kind == 'cards':
+            html = export_source.read_text(kind + "/" + item_id + ".html")
+            html_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+            if export_transform_options is not None:
+                started = time.monotonic()
+                if export_body_cache is not None:
+                    rendered = export_body_cache.lookup(export_body_cache.key(html_hash), document['Title'])
+                    cached = rendered is not None
+                if cached:
+                    timings.append(('body_cache', time.monotonic() - started, len(html)))
+                else:
+                    rendered = transform_html(html, document['Title'], *export_transform_options)
+                    timings.append(('html_transform', time.monotonic() - started, len(html)))
+                html = None
+    except (yaml.YAMLError, OSError, zipfile.BadZipFile, zlib.error) as e:
+        error = repr(e)
+    return kind, item_id, document, html_hash, html, rendered, cached, error, timings
+
+
+class ExportLoader:
+    """Indexes the export once and parses every card, folder and board in a process pool, keyed by ID."""
+
+    def __init__(self, source, workers=None, transform_options=None, memoize=True, metrics=None, body_cache=None):
+        self.source = source
+        self.body_cache = body_cache
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.memoize = memoize
+        self.workers = workers
+        self.transform_options = transform_options
+        self.documents = {}
+        self.cards = {}
+
+    def load(self):
+        started = time.monotonic()
+        jobs = []
+        for kind in ('cards', 'folders', 'boards', 'board-groups'):
+            for file_name in self.source.list(kind):
+                if file_name.endswith('.yaml'):
+                    jobs.append((kind, file_name[:-len('.yaml')]))
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_export_worker,
+                                 initargs=(self.source, self.transform_options,
+                                           self.body_cache.path if self.body_cache is not None else None)) as pool:
+            for kind, item_id, document, html_hash, html, rendered, cached, error, timings in pool.map(
+                    parse_export_file, jobs, chunksize=32):
+                for phase, seconds, size in timings:
+                    self.metrics.record(phase, seconds, size)
+                if error is not None:
+                    logging.error('ERROR reading {}/{}: {}'.format(kind, item_id, error))
+                    continue
+                self.documents[(kind, item_id)] = document
+                if kind == 'cards':
+                    self.cards[item_id] = (html_hash, html, rendered)
+                    if rendered is not None and self.body_cache is not None:
+                        # the loader processes only read the cache, this process records what they used
+                        if cached:
+                            self.body_cache.touch(self.body_cache.key(html_hash))
+                        else:
+                            self.body_cache.store(self.body_cache.key(html_hash), rendered)
+        logging.info('PARSED {} export files in {:.2f}s'.format(len(jobs), time.monotonic() - started))
+
+    def document(self, kind, item_id):
+        document = self.documents.get((kind, item_id))
+        if document is None:
+            # not loaded up front (streaming), added after indexing, or failed to parse above
+            with self.metrics.phase('yaml_load'):
+                document = load_yaml(self.source, kind + "/" + item_id + ".yaml")
+            if self.memoize or kind != 'cards':
+                self.documents[(kind, item_id)] = document
+        return document
+
+    def card(self, card_id):
+        """Returns the hash of the card HTML and either the HTML or its already converted body."""
+        if card_id in self.cards:
+            return self.cards[card_id]
+        html = self.source.read_text("cards/" + card_id + ".html")
+        card = (hashlib.sha256(html.encode("utf-8")).hexdigest(), html, None)
+        if self.memoize:
+            self.cards[card_id] = card
+        return card
+
+
+def walk_board(confluence_node, board_id, loader, keep_children=True):
+    content = loader.document('boards', board_id)
+
+    if 'Items' not in content:
+        logging.warning("WARNING no items found for: boardId=" + board_id)
+        return
+
+    for item in content['Items']:
+        if item['Type'] == 'card':
+            card = ConfluencePage("not yet available", "not created yet", confluence_node.id, "<h2>placeholder</h2>",
+                                  item['ID'])
+            confluence_node.add_child(card, keep_children)
+            yield card, item['ID']
+        elif item['Type'] == 'section':
+            section = ConfluencePage(item['Title'], "not created yet", confluence_node.id, "<h2>placeholder</h2>")
+            confluence_node.add_child(section, keep_children)
+            yield section, None
+            if 'Items' not in item:
+                logging.warning("WARNING no items found for section: boardId=" + board_id)
+                return
+            for subitem in item['Items']:
+                card = ConfluencePage("not yet available", "not created yet", section.id, "<h2>placeholder</h2>",
+                                      subitem['ID'])
+                section.add_child(card, keep_children)
+                yield card, subitem['ID']
+        else:
+            logging.error("ERROR not a CARD/SECTION type: boardId=" + board_id + ', item=' + str(item))
+
+
+def walk_board_group(confluence_node, board_group_id, loader, keep_children=True):
+    content = loader.document('board-groups', board_group_id)
+
+    if 'Boards' not in content:
+        logging.warning("WARNING no items found for: boardGroupId=" + board_group_id)
+        return
+
+    counter = 1
+    for itemID in content['Boards']:
+        board = ConfluencePage(content['Title'] + "(" + str(counter) + ")", "-1", confluence_node.id,
+                               "<h2>" + content['Title'] + "</h2>", itemID)
+        confluence_node.add_child(board, keep_children)
+        yield board, None
+        yield from walk_board(board, itemID, loader, keep_children)
+        counter = counter + 1
+
+
+def fill_card(confluence_node, card_id, loader, with_content=True, date_disclaimer=False, link_index=None):
+    definition = loader.document('cards', card_id)
+
+    try:
+        tags = definition['Tags']
+    except:
+        tags = None
+
+    confluence_node.update_title(definition['Title'])
+    confluence_node.update_labels(tags)
+    if link_index is not None:
+        link_index.add(confluence_node, definition)
+    if with_content:
+        fill_card_content(confluence_node, card_id, loader, date_disclaimer)
+
+
+def fill_card_content(confluence_node, card_id, loader, date_disclaimer=False):
+    definition = loader.document('cards', card_id)
+    html_hash, content, rendered = loader.card(card_id)
+
+    disclaimer = ""
+    if date_disclaimer:
+        externalLastUpdated = definition['externalLastUpdated']
+        lastUpdatedUTC = datetime.datetime.fromtimestamp(externalLastUpdated / 1000.0, datetime.timezone.utc)
+        lastUpdatedDateStr = lastUpdatedUTC.strftime('%Y-%m-%d')
+        lastUpdatedTimeStr = lastUpdatedUTC.strftime('%H:%M:%S %Z')
+        disclaimer = '<h6><span style="color: rgb(191,38,0);">Imported from Guru. ' \
+                     'Original update on <time datetime="{}"></time> at {}</span></h6>'.format(lastUpdatedDateStr,
+                                                                                         lastUpdatedTimeStr)
+
+    if rendered is not None:
+        confluence_node.set_rendered(rendered, disclaimer)
+    else:
+        confluence_node.set_content(content, disclaimer)
+    # the Guru title, not the planned one: --stream plans titles before the content is filled
+    source = [definition.get('externalLastUpdated'), normalize_title(definition['Title']), definition.get('Tags'),
+              'yes' if date_disclaimer else 'no', html_hash]
+    confluence_node.sourceHash = hashlib.sha256(json.dumps(source).encode("utf-8")).hexdigest()
+
+
+def walk_folder(confluence_node, folder_id, loader, keep_children=True):
+    content = loader.document('folders', folder_id)
+
+    if not 'Title' in content:
+        logging.warning('WARNING no title found for: folderId=' + folder_id)
+        yield confluence_node, None
+        return
+    confluence_node.update_title(content['Title'])
+
+    if 'Description' not in content:
+        confluence_node.set_content(content['Title'])
+    else:
+        confluence_node.set_content(content['Description'])
+    yield confluence_node, None
+
+    if 'Items' not in content:
+        logging.warning('WARNING no items found for: folderId=' + folder_id)
+        return
+
+    for item in content['Items']:
+        if item['Type'] == 'card':
+            card = ConfluencePage("not yet available", "not created yet", confluence_node.id, "<h2>placeholder</h2>",
+                                  item['ID'])
+            confluence_node.add_child(card, keep_children)
+            yield card, item['ID']
+        elif item['Type'] == 'folder':
+            folder = ConfluencePage("unknown", "-1", confluence_node.id, "<h2>unknown</h2>", item['ID'])
+            confluence_node.add_child(folder, keep_children)
+            yield from walk_folder(folder, item['ID'], loader, keep_children)
+        else:
+            logging.error('ERROR not a CARD/SECTION type: folderId=' + folder_id + ', item=' + str(item))
+
+
+def walk_collection(content, root_node, loader, keep_children=True):
+    """Yields every page of the collection parent first, with the Guru card ID for pages that are cards."""
+    export_version = 1
+
+    if 'Version' in content:
+        if content['Version'] == 2:
+            export_version = 2
+
+    for item in content['Items']:
+        # version 1
+        if item['Type'] == 'boardgroup' and export_version == 1:
+            boardgroup = ConfluencePage(item['Title'], "-1", root_node.id, "<h2>" + item['Title'] + "</h2>",
+                                        item['ID'])
+            root_node.add_child(boardgroup, keep_children)
+            yield boardgroup, None
+            yield from walk_board_group(boardgroup, item['ID'], loader, keep_children)
+        if item['Type'] == 'board' and export_version == 1:
+            board = ConfluencePage(item['Title'], "-1", root_node.id, "<h2>" + item['Title'] + "</h2>", item['ID'])
+            root_node.add_child(board, keep_children)
+            yield board, None
+            yield from walk_board(board, item['ID'], loader, keep_children)
+        if item['Type'] == 'card' and export_version == 1:
+            card = ConfluencePage(item['Title'], "-1", root_node.id, "<h2>" + item['Title'] + "</h2>", item['ID'])
+            root_node.add_child(card, keep_children)
+            yield card, item['ID']
+        # version 2
+        if item['Type'] == 'folder' and export_version == 2:
+            folder = ConfluencePage("unknown", "-1", root_node.id, "<h2>unknown</h2>", item['ID'])
+            root_node.add_child(folder, keep_children)
+            yield from walk_folder(folder, item['ID'], loader, keep_children)
+        if item['Type'] == 'card' and export_version == 2:
+            card = ConfluencePage("unknown", "-1", root_node.id, "<h2>unknown</h2>", item['ID'])
+            root_node.add_child(card, keep_children)
+            yield card, item['ID']
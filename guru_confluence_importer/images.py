@@ -0,0 +1,176 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+# images are written back in their own format, so the file name and its content type stay valid
+IMAGE_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG'}
+
+# part of every cache key, bump it when optimize_image produces different output
+OPTIMIZER_VERSION = 1
+
+
+# export source and settings of the current optimizer process, set once per worker by init_image_worker
+image_source = None
+image_settings = None
+
+
+def init_image_worker(source, cache_dir, max_dimension, jpeg_quality):
+    global image_source, image_settings
+    image_source = source
+    image_settings = (cache_dir, max_dimension, jpeg_quality)
+
+
+def optimize_image(file_path):
+    """Runs in a worker process. Returns (cached file or None when the original is kept, original size, seconds)."""
+    started = time.monotonic()
+    cache_dir, max_dimension, jpeg_quality = image_settings
+    with image_source.open(file_path) as f:
+        original = f.read()
+    settings = '{}:{}:{}'.format(OPTIMIZER_VERSION, max_dimension, jpeg_quality)
+    key = hashlib.sha256(original).hexdigest() + '-' + hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]
+    cache_path = os.path.join(cache_dir, key + os.path.splitext(file_path)[1].lower())
+    keep_marker = os.path.join(cache_dir, key + '.keep')
+    if os.path.isfile(cache_path):
+        return cache_path, len(original), time.monotonic() - started
+    if os.path.isfile(keep_marker):
+        return None, len(original), time.monotonic() - started
+
+    try:
+        optimized = recompress(original, max_dimension, jpeg_quality)
+    except Exception:
+        # not an image Pillow can read, it is uploaded as exported
+        optimized = None
+    if optimized is None or len(optimized) >= len(original):
+        # remembered as well, so reruns do not decode the image again just to find nothing to gain
+        open(keep_marker, 'wb').close()
+        return None, len(original), time.monotonic() - started
+    temporary_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+        f.write(optimized)
+    os.replace(temporary_path, cache_path)
+    return cache_path, len(original), time.monotonic() - started
+
+
+def recompress(original, max_dimension, jpeg_quality):
+    from PIL import Image
+    from PIL import ImageOps
+
+    image = Image.open(io.BytesIO(original))
+    image_format = image.format
+    if image_format not in ('PNG', 'JPEG') or getattr(image, 'is_animated', False):
+        return None
+    resized = False
+    if max_dimension and max(image.size) > max_dimension:
+        if image_format == 'JPEG':
+            # the EXIF orientation is dropped on save, so it is applied to the pixels first
+            image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        resized = True
+    output = io.BytesIO()
+    if image_format == 'PNG':
+        # lossless: same pixels, better compression
+        image.save(output, 'PNG', optimize=True)
+    elif resized:
+        image.save(output, 'JPEG', quality=jpeg_quality, optimize=True, progressive=True)
+    else:
+        # re-encoding a JPEG at its own size only loses quality
+        return None
+    return output.getvalue()
+
+
+class OptimizedImageSource:
+    """Serves the export with large images recompressed or downsized in worker processes, cached on disk by content."""
+
+    def __init__(self, source, cache_dir, min_bytes=256 * 1024, max_dimension=None, jpeg_quality=85, workers=None,
+                 metrics=None):
+        self.source = source
+        self.cache_dir = cache_dir
+        self.min_bytes = min_bytes
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.metrics = metrics
+        # the source goes to each worker once, tasks only carry the file name
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_image_worker,
+                                            initargs=(source, cache_dir, max_dimension, jpeg_quality))
+        self.futures = {}
+        self.results = {}
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def is_candidate(self, file_path):
+        extension = os.path.splitext(file_path)[1].lower()
+        return extension in IMAGE_FORMATS and self.source.is_file(file_path) and \
+            self.source.size(file_path) >= self.min_bytes
+
+    def submit(self, file_path):
+        with self.lock:
+            if file_path in self.futures:
+                return self.futures[file_path]
+            future = None
+            if self.is_candidate(file_path):
+                future = self.executor.submit(optimize_image, file_path)
+            self.futures[file_path] = future
+            return future
+
+    def prefetch(self, directory):
+        """Starts optimizing every image of the directory, so the work overlaps page creation."""
+        count = 0
+        for file_name in sorted(self.source.list(directory)):
+            if self.submit(directory + '/' + file_name) is not None:
+                count = count + 1
+        logging.info('OPTIMIZING {} images in the background'.format(count))
+
+    def optimized_path(self, file_path):
+        future = self.submit(file_path)
+        if future is None:
+            return None
+        with self.lock:
+            if file_path in self.results:
+                return self.results[file_path]
+        try:
+            cache_path, original_size, seconds = future.result()
+        except Exception as e:
+            cache_path, original_size, seconds = None, 0, 0.0
+            error = e
+        else:
+            error = None
+        with self.lock:
+            # several upload threads may wait for the same image, it is reported once
+            if file_path in self.results:
+                return self.results[file_path]
+            self.results[file_path] = cache_path
+        if error is not None:
+            logging.warning('IMAGE NOT OPTIMIZED {}: {}'.format(file_path, repr(error)))
+            return None
+        if self.metrics is not None:
+            self.metrics.record('image_optimize', seconds, original_size)
+        if cache_path is not None:
+            logging.info('IMAGE OPTIMIZED {} ({} -> {} bytes)'.format(file_path, original_size,
+                                                                      os.path.getsize(cache_path)),
+                         extra={'event': 'image_optimized', 'file': file_path})
+        return cache_path
+
+    def is_file(self, name):
+        return self.source.is_file(name)
+
+    def size(self, name):
+        cache_path = self.optimized_path(name)
+        return os.path.getsize(cache_path) if cache_path is not None else self.source.size(name)
+
+    def open(self, name):
+        cache_path = self.optimized_path(name)
+        return open(cache_path, 'rb') if cache_path is not None else self.source.open(name)
+
+    def read_text(self, name):
+        return self.source.read_text(name)
+
+    def list(self, directory):
+        return self.source.list(directory)
@@ -0,0 +1,610 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import BodyCache
+from .client import AdaptiveTokenBucket
+from .client import ConfluenceClient
+from .client import ConfluenceError
+from .client import DuplicateTitleError
+from .client import RetryPolicy
+from .client import is_child_of
+from .export import DirectorySource
+from .export import ExportLoader
+from .export import ZipSource
+from .export import fill_card
+from .export import fill_card_content
+from .export import load_yaml
+from .export import walk_collection
+from .logs import page_context
+from .metrics import Metrics
+from .metrics import ProgressReporter
+from .pages import CardLinkIndex
+from .pages import ConfluencePage
+from .pages import TitlePlanner
+from .pages import normalize_title
+from .plan import PlanEstimator
+from .plan import PlanReader
+from .plan import PlanWriter
+from .state import ImportJournal
+from .state import SyncManifest
+from .transform import transform_html
+from .uploads import AttachmentUploader
+from .uploads import LabelWriter
+from .uploads import ResourceIndex
+
+
+class IncompletePageError(Exception):
+    """A page exists but a step after its creation failed; it is not journaled as done, so --resume retries it."""
+
+
+def body_references_resolved(create_op, confluence_node):
+    """True when the body Confluence stored still holds every attachment reference that was sent."""
+    try:
+        stored = create_op['body']['storage']['value']
+    except (KeyError, TypeError):
+        return False
+    return stored.count('<ri:attachment') >= confluence_node.htmlContent.count('<ri:attachment')
+
+
+class Importer:
+    """Imports one Guru collection into Confluence as configured by an ImportConfig."""
+
+    def __init__(self, config, client=None, metrics=None, title_planner=None):
+        # a shared client, metrics and per-space title planner let several imports run in one process
+        self.config = config
+        if metrics is None:
+            metrics = client.metrics if client is not None else Metrics()
+        self.metrics = metrics
+        self.client = client
+        self.owns_client = client is None
+        self.journal = None
+        self.manifest = None
+        self.labeler = None
+        self.uploader = None
+        self.title_planner = title_planner
+        self.opened = False
+        # pages the previous run sent a create request for but stopped before it was answered, by journal key
+        self.interrupted = {}
+        self.link_index = CardLinkIndex()
+        self.resource_aliases = {}
+        self.asset_page_title = None
+        self.body_cache = None
+        self.root_node = None
+
+    def create_client(self):
+        config = self.config
+        return ConfluenceClient(config.organization, config.user, config.api_key,
+                                max(config.pool_size, config.workers * max(1, config.upload_workers)), config.timeout,
+                                RetryPolicy(config.max_retries), AdaptiveTokenBucket(config.max_rate),
+                                config.target_url, self.metrics)
+
+    def create_source(self):
+        if self.config.collection_zip is not None:
+            return ZipSource(self.config.collection_zip)
+        return DirectorySource(self.config.collection_dir)
+
+    def transform_options(self):
+        return self.config.html_parser, self.resource_aliases, self.asset_page_title
+
+    def open_body_cache(self):
+        """Opens the --body-cache for the current transform options, once the aliases and assets title are known."""
+        if self.config.body_cache is not None:
+            self.body_cache = BodyCache(self.config.body_cache, self.config.body_cache_mb * 1024 * 1024,
+                                        self.transform_options())
+        return self.body_cache
+
+    def render(self, confluence_node):
+        content = confluence_node.pendingContent
+        if content is None:
+            return
+        body_cache = self.body_cache
+        if body_cache is not None:
+            started = time.monotonic()
+            key = body_cache.key(hashlib.sha256(content.encode("utf-8")).hexdigest())
+            result = body_cache.get(key, confluence_node.title)
+            if result is not None:
+                self.metrics.record('body_cache', time.monotonic() - started, len(content))
+                confluence_node.set_rendered(result, confluence_node.contentPrefix)
+                return
+        with self.metrics.phase('html_transform', len(content)):
+            result = transform_html(content, confluence_node.title, *self.transform_options())
+        confluence_node.set_rendered(result, confluence_node.contentPrefix)
+        if body_cache is not None:
+            body_cache.store(key, result)
+
+    def create_node(self, confluence_node, on_created=None):
+        with page_context(confluence_node):
+            self._create_node(confluence_node, on_created)
+
+    def _create_node(self, confluence_node, on_created=None):
+        client = self.client
+        space = self.config.space_key
+        journal = self.journal
+        manifest = self.manifest
+        labeler = self.labeler
+        single_write = self.config.single_write
+        migrate_tags = self.config.migrate_tags
+        key = confluence_node.key
+        create_op = None
+        inline_labels = None
+        if migrate_tags and labeler.mode == 'inline':
+            inline_labels = confluence_node.labelsMetadata
+        self.render(confluence_node)
+        fingerprint = confluence_node.fingerprint()
+        link_fix_up = self.link_index.resolve(confluence_node, journal is not None and key in journal.unlinked)
+        previous = manifest.previous.get(key) if manifest is not None else None
+        if journal is not None and key in journal.versions:
+            confluence_node.version = journal.versions[key]
+
+        if previous is not None:
+            new_page_id = previous['page_id']
+            confluence_node.set_id(new_page_id)
+            if on_created is not None:
+                on_created(confluence_node)
+            if previous['hash'] == fingerprint:
+                manifest.keep(key)
+                logging.info('UNCHANGED ' + new_page_id)
+                return
+            if journal is None or key not in journal.versions:
+                confluence_node.version = previous['version']
+            logging.info('CHANGED ' + new_page_id)
+        elif journal is not None and key in journal.pages:
+            new_page_id = journal.pages[key]
+            confluence_node.title = journal.titles[key]
+            confluence_node.set_id(new_page_id)
+            logging.info('RESUMED ' + new_page_id)
+            if on_created is not None:
+                on_created(confluence_node)
+        elif key in self.interrupted and self.interrupted[key]['title'] == confluence_node.title and \
+                is_child_of(self.interrupted[key], confluence_node.parentId):
+            new_page_id = self.interrupted[key]['id']
+            confluence_node.set_id(new_page_id)
+            confluence_node.version = self.interrupted[key]['version']['number']
+            logging.warning('ADOPTED {} "{}", created by the interrupted run'.format(new_page_id,
+                                                                                 confluence_node.title))
+            journal.record('created', key, page_id=new_page_id, title=confluence_node.title)
+            if on_created is not None:
+                on_created(confluence_node)
+        else:
+            expand = 'body.storage' if single_write else None
+            if journal is not None:
+                # a resumed run looks the title up if the answer to this request is never journaled
+                journal.record('creating', key, title=confluence_node.title)
+            try:
+                create_op = client.create_confluence_page(space, confluence_node.parentId, confluence_node.title,
+                                                          confluence_node.htmlContent, expand, inline_labels)
+            except DuplicateTitleError:
+                # only a page created after the planner listed the space can still hold the title
+                self.title_planner.reassign(confluence_node)
+                if journal is not None:
+                    journal.record('creating', key, title=confluence_node.title)
+                create_op = client.create_confluence_page(space, confluence_node.parentId, confluence_node.title,
+                                                          confluence_node.htmlContent, expand, inline_labels)
+
+            new_page_id = create_op['id']
+            confluence_node.set_id(new_page_id)
+            logging.info('CREATED ' + new_page_id)
+            if journal is not None:
+                journal.record('created', key, page_id=new_page_id, title=confluence_node.title)
+                if inline_labels is not None:
+                    journal.record('labelled', key)
+            if on_created is not None:
+                on_created(confluence_node)
+
+        uploaded_before = set(previous['files']) if previous is not None else set()
+        confluence_node.uploadedFiles.update(uploaded_before)
+
+        if journal is not None and key in journal.done:
+            confluence_node.uploadedFiles.update(journal.files[key])
+            if migrate_tags and labeler.mode == 'deferred' and confluence_node.labelsMetadata is not None and \
+                    key not in journal.labelled:
+                # the previous run stopped before its deferred labels were written
+                labeler.apply(confluence_node)
+            if manifest is not None:
+                manifest.record(confluence_node)
+            if key in journal.unlinked:
+                self.link_index.defer(confluence_node, link_fix_up)
+            return
+
+        failures = []
+
+        if migrate_tags:
+            if confluence_node.labelsMetadata is None:
+                logging.info('NO LABELS EXIST ' + new_page_id)
+            elif create_op is not None and inline_labels is not None:
+                logging.info('LABELS SET ON CREATE ' + new_page_id)
+            elif previous is not None and previous['labels'] == confluence_node.labelsMetadata:
+                logging.info('LABELS UNCHANGED ' + new_page_id)
+            elif journal is None or key not in journal.labelled:
+                if not labeler.apply(confluence_node):
+                    failures.append('labels')
+
+        # upload images, then attachments
+        files = [(image, 'IMAGE') for image in confluence_node.images] + \
+                [(attachment, 'ATTACHMENT') for attachment in confluence_node.attachments]
+        failed_files = self.uploader.upload(confluence_node, [(file_name, kind) for file_name, kind in files
+                                                              if file_name not in uploaded_before])
+        if len(failed_files) > 0:
+            failures.append('{} of its files'.format(len(failed_files)))
+
+        needs_update = previous is not None or len(confluence_node.images) > 0 or len(confluence_node.attachments) > 0
+        if needs_update and previous is None and single_write:
+            # the page was created with its final body, attachment references resolve by filename once uploaded
+            if create_op is None or body_references_resolved(create_op, confluence_node):
+                needs_update = False
+                logging.info('CREATED WITH FINAL BODY - UPDATE not needed ' + new_page_id)
+            else:
+                logging.warning('ATTACHMENT REFERENCES MISSING after create, falling back to update ' + new_page_id)
+
+        if needs_update:
+            if journal is not None and key in journal.updated:
+                logging.info('ALREADY UPDATED ' + new_page_id)
+            else:
+                try:
+                    update_op = client.update_confluence_page(space, new_page_id, confluence_node.title,
+                                                              confluence_node.htmlContent, confluence_node.version + 1)
+                    confluence_node.version = confluence_node.version + 1
+                    logging.info('UPDATED ' + update_op['id'])
+                    if journal is not None:
+                        journal.record('updated', key, version=confluence_node.version)
+                except ConfluenceError:
+                    # the page keeps its first body until a --resume or --sync updates it
+                    logging.error('UPDATE FAILED ' + new_page_id)
+                    failures.append('its update')
+        elif not single_write:
+            logging.info('NO IMAGES or ATTACHMENTS - UPDATE not needed')
+
+        if len(failures) > 0:
+            # not journaled as done, so --resume retries the failed steps
+            if manifest is not None:
+                manifest.record(confluence_node, complete=False)
+            raise IncompletePageError('page {} is incomplete, writing {} failed'.format(new_page_id,
+                                                                                       ' and '.join(failures)))
+        if journal is not None:
+            journal.record('done', key, files=sorted(confluence_node.uploadedFiles))
+        if manifest is not None:
+            manifest.record(confluence_node)
+        if link_fix_up is not None:
+            self.link_index.defer(confluence_node, link_fix_up)
+
+    def open(self):
+        """Opens the journal and manifest and registers the pages they own with the title planner."""
+        if self.opened:
+            return self
+        config = self.config
+        if self.client is None:
+            self.client = self.create_client()
+        self.journal = ImportJournal(config.journal, config.resume) if config.journal is not None else None
+        self.manifest = SyncManifest(config.manifest, config.sync) if config.manifest is not None else None
+        # pages this import created before keep their titles, every other existing title is avoided
+        ownedPages = {key: entry['page_id'] for key, entry in self.manifest.previous.items()} if self.manifest else {}
+        if self.journal is not None:
+            ownedPages.update(self.journal.pages)
+            self.interrupted = self.find_interrupted()
+            ownedPages.update({key: page['id'] for key, page in self.interrupted.items()})
+        if self.title_planner is None:
+            existingTitles = self.client.list_page_titles(config.space_key)
+            logging.info('FOUND {} existing page titles in space {}'.format(len(existingTitles), config.space_key))
+            self.title_planner = TitlePlanner(existingTitles, ownedPages)
+        else:
+            self.title_planner.own(ownedPages)
+        self.opened = True
+        return self
+
+    def find_interrupted(self):
+        """Looks up the pages whose create request the previous run sent without journaling the answer."""
+        interrupted = {}
+        for key, title in self.journal.creating.items():
+            if key in self.journal.pages:
+                continue
+            page = self.client.find_page(self.config.space_key, title, 'ancestors,version')
+            if page is not None:
+                interrupted[key] = page
+        if len(interrupted) > 0:
+            logging.info('FOUND {} pages created by the interrupted run'.format(len(interrupted)))
+        return interrupted
+
+    def run(self):
+        """Runs the whole import and returns the run statistics (see Metrics.summary)."""
+        config = self.config
+        started = time.monotonic()
+        plan = None
+        if config.execute_plan is not None:
+            plan = PlanReader(config.execute_plan)
+            plan.check(config)
+        self.open()
+        self.root_node = rootNode = ConfluencePage("DemoImport", config.parent, "-inf", "<h1>Guru import</h1>",
+                                                   config.root_key)
+        if config.attachment_strategy == 'shared':
+            # created before the tree is parsed so no card can claim the title first
+            assetsNode = ConfluencePage(config.assets_title, "-1", rootNode.id,
+                                        "<p>Files shared by the imported Guru cards.</p>", "assets")
+            assetsNode.key = rootNode.key + "/assets"
+
+        client = self.client
+        journal = self.journal
+        manifest = self.manifest
+        self.labeler = labeler = LabelWriter(client, config.labels_mode, journal, config.workers)
+        source = self.create_source()
+        images = None
+        if config.optimize_images:
+            from .images import OptimizedImageSource
+            images = OptimizedImageSource(source, config.image_cache, config.image_min_kb * 1024,
+                                          config.image_max_dimension, config.image_quality, config.image_workers,
+                                          self.metrics)
+            images.prefetch('resources')
+        self.uploader = uploader = AttachmentUploader(client, source, config.attachment_strategy, journal,
+                                                      config.upload_batch_files,
+                                                      config.upload_batch_mb * 1024 * 1024, config.upload_workers,
+                                                      upload_source=images, page_workers=config.workers)
+        if uploader.index is not None:
+            uploader.index.build()
+            self.resource_aliases = uploader.index.aliases
+        if config.attachment_strategy == 'shared':
+            # the assets page title is needed by every converted card body
+            self.title_planner.assign(assetsNode)
+            self.create_node(assetsNode)
+            uploader.assets_page = assetsNode
+            self.asset_page_title = assetsNode.title
+            if manifest is not None:
+                for entry in manifest.previous.values():
+                    uploader.seed(assetsNode, entry['files'])
+        body_cache = self.open_body_cache() if plan is None else None
+
+        progress = None
+        if plan is not None:
+            # bodies were converted when the plan was compiled, the export is only read for its files
+            for confluence_node, card in plan.pages(rootNode, self.asset_page_title):
+                if card is not None:
+                    self.link_index.add(confluence_node, card)
+                self.title_planner.assign(confluence_node)
+                self.metrics.add_pages(1)
+            self.link_index.complete = True
+            logging.info('PLAN {} loaded, estimated {} requests'.format(config.execute_plan,
+                                                                       plan.summary['requests']))
+            parse_seconds = time.monotonic() - started
+            upload_started = time.monotonic()
+            if config.progress:
+                progress = ProgressReporter(self.metrics).start()
+            runner = PageScheduler(self, config.workers)
+            failed_pages = runner.run(rootNode.children)
+        elif config.stream:
+            # cards are read one at a time right before their upload and dropped afterwards
+            loader = ExportLoader(source, memoize=False, metrics=self.metrics)
+            runner = PageStreamer(self, loader, config.workers, config.queue_size)
+            parse_seconds = None
+            upload_started = time.monotonic()
+            if config.progress:
+                progress = ProgressReporter(self.metrics).start()
+            failed_pages = runner.run(walk_collection(load_yaml(source, "collection.yaml"), rootNode, loader,
+                                                      keep_children=False))
+        else:
+            loader = ExportLoader(source, config.parse_workers, self.transform_options(), metrics=self.metrics,
+                                  body_cache=body_cache)
+            loader.load()
+            for confluence_node, card_id in walk_collection(load_yaml(source, "collection.yaml"), rootNode, loader):
+                if card_id is not None:
+                    fill_card(confluence_node, card_id, loader, date_disclaimer=config.date_disclaimer,
+                              link_index=self.link_index)
+                self.title_planner.assign(confluence_node)
+                self.metrics.add_pages(1)
+            self.link_index.complete = True
+            parse_seconds = time.monotonic() - started
+            upload_started = time.monotonic()
+            if config.progress:
+                progress = ProgressReporter(self.metrics).start()
+            runner = PageScheduler(self, config.workers)
+            failed_pages = runner.run(rootNode.children)
+        failed_labels = labeler.flush()
+        if manifest is not None:
+            for key in failed_labels:
+                manifest.invalidate(key)
+        failed_links = self.link_index.fix_up(client, config.space_key, journal, manifest, config.workers)
+        upload_seconds = time.monotonic() - upload_started
+        if progress is not None:
+            progress.stop()
+        uploader.close()
+        if images is not None:
+            images.close()
+        if body_cache is not None:
+            body_cache.close()
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.save()
+        if self.owns_client:
+            client.close()
+        if len(failed_pages) > 0:
+            skipped = len([page for page in failed_pages if not page.exists])
+            logging.error('ERROR {} page(s) failed, the subtrees of {} were not imported'.format(len(failed_pages),
+                                                                                               skipped))
+        if len(failed_labels) > 0:
+            logging.error('ERROR the deferred labels of {} page(s) failed'.format(len(failed_labels)))
+        if len(failed_links) > 0:
+            logging.error('ERROR the link updates of {} page(s) failed'.format(len(failed_links)))
+        failed = len(set(page.key for page in failed_pages) | set(failed_labels) | set(failed_links))
+        logging.info('FINISHED {} pages in {:.2f}s ({:.2f} pages/s)'.format(
+            runner.processed, upload_seconds, runner.processed / max(upload_seconds, 0.001)))
+        summary = self.metrics.summary()
+        summary.update({'pages': runner.processed, 'failed': failed, 'parse_seconds': parse_seconds,
+                        'upload_seconds': upload_seconds, 'total_seconds': time.monotonic() - started})
+        return summary
+
+
+    def compile_plan(self, path):
+        """Parses and converts the export into a plan file without contacting Confluence, returns its totals.
+
+        The plan holds one record per page in creation order (parent key, title, labels, files with sizes and the
+        converted body) and the estimated requests and bytes; --execute-plan imports it without the export YAML.
+        """
+        config = self.config
+        started = time.monotonic()
+        self.root_node = rootNode = ConfluencePage("DemoImport", config.parent, "-inf", "<h1>Guru import</h1>",
+                                                   config.root_key)
+        source = self.create_source()
+        index = None
+        if config.attachment_strategy != 'page':
+            index = ResourceIndex(source)
+            index.build()
+            self.resource_aliases = index.aliases
+        if config.attachment_strategy == 'shared':
+            # planned against the space when the plan is executed, see PlanReader.pages
+            self.asset_page_title = normalize_title(config.assets_title)
+        body_cache = self.open_body_cache()
+        loader = ExportLoader(source, config.parse_workers, self.transform_options(), metrics=self.metrics,
+                              body_cache=body_cache)
+        loader.load()
+        pages = []
+        for confluence_node, card_id in walk_collection(load_yaml(source, "collection.yaml"), rootNode, loader):
+            card = None
+            if card_id is not None:
+                fill_card(confluence_node, card_id, loader, date_disclaimer=config.date_disclaimer,
+                          link_index=self.link_index)
+                card = loader.document('cards', card_id)
+            pages.append((confluence_node, card))
+
+        estimator = PlanEstimator(config, source, index)
+        writer = PlanWriter(path, config)
+        for confluence_node, card in pages:
+            self.render(confluence_node)
+            files = estimator.files_of(confluence_node)
+            writer.page(confluence_node, files, card, estimator.page(confluence_node, files))
+        summary = estimator.summary()
+        writer.close(summary)
+        if body_cache is not None:
+            body_cache.close()
+        duration = 'about {}s at {} requests/s'.format(summary['estimated_seconds'], summary['max_rate']) \
+            if summary['estimated_seconds'] is not None else 'no --max-rate to estimate the duration'
+        logging.info('PLANNED {} pages into {}: {} requests, {} bytes ({} in {} files), {}'
+                     .format(summary['pages'], path, summary['requests'], summary['bytes'], summary['upload_bytes'],
+                             summary['files'], duration))
+        summary.update(self.metrics.summary())
+        summary['total_seconds'] = time.monotonic() - started
+        return summary
+
+
+class PageScheduler:
+    """Runs create_node on a thread pool, queueing the children of a page as soon as it has an ID."""
+
+    def __init__(self, importer, workers=1):
+        self.importer = importer
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.condition = threading.Condition()
+        self.outstanding = 0
+        self.processed = 0
+        self.failed = []
+
+    def submit(self, confluence_node):
+        with self.condition:
+            self.outstanding = self.outstanding + 1
+        self.executor.submit(self._run, confluence_node)
+
+    def submit_children(self, confluence_node):
+        for child in confluence_node.children:
+            self.submit(child)
+
+    def _run(self, confluence_node):
+        try:
+            self.importer.create_node(confluence_node, self.submit_children)
+        except Exception as e:
+            if confluence_node.exists:
+                # on_created queued the children already
+                logging.error('ERROR finishing "{}" ({}): {}'.format(confluence_node.title, confluence_node.id,
+                                                                      repr(e)))
+            else:
+                logging.error('ERROR creating "{}", skipping its subtree: {}'.format(confluence_node.title, repr(e)))
+            with self.condition:
+                self.failed.append(confluence_node)
+        finally:
+            self.importer.metrics.page_done()
+            with self.condition:
+                self.processed = self.processed + 1
+                self.outstanding = self.outstanding - 1
+                if self.outstanding == 0:
+                    self.condition.notify_all()
+
+    def run(self, pages):
+        for page in pages:
+            self.submit(page)
+        with self.condition:
+            while self.outstanding > 0:
+                self.condition.wait()
+        self.executor.shutdown()
+        return self.failed
+
+
+class PageStreamer:
+    """Uploads pages while the export is still being walked, card bodies are loaded just before their upload."""
+
+    def __init__(self, importer, loader, workers=1, queue_size=100):
+        self.importer = importer
+        self.loader = loader
+        self.workers = workers
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def produce(self, pages):
+        importer = self.importer
+        try:
+            for confluence_node, card_id in pages:
+                confluence_node.created = threading.Event()
+                if card_id is not None:
+                    fill_card(confluence_node, card_id, self.loader, with_content=False,
+                              link_index=importer.link_index)
+                importer.title_planner.assign(confluence_node)
+                importer.metrics.add_pages(1)
+                self.jobs.put((confluence_node, card_id))
+            importer.link_index.complete = True
+        except Exception as e:
+            logging.error('ERROR reading the collection, stopped queueing pages: {}'.format(repr(e)))
+        finally:
+            for worker in range(self.workers):
+                self.jobs.put(None)
+
+    def consume(self):
+        importer = self.importer
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            confluence_node, card_id = job
+            parent = confluence_node.parent
+            try:
+                # pages are queued parent first, so the parent is already done or being created by another worker
+                if parent.created is not None:
+                    parent.created.wait()
+                if parent.failed:
+                    raise RuntimeError('parent page "{}" was not created'.format(parent.title))
+                confluence_node.set_parent(parent.id)
+                if card_id is not None:
+                    fill_card_content(confluence_node, card_id, self.loader, importer.config.date_disclaimer)
+                importer.create_node(confluence_node, lambda node: node.created.set())
+            except Exception as e:
+                logging.error('ERROR creating "{}": {}'.format(confluence_node.title, repr(e)))
+                confluence_node.failed = not confluence_node.created.is_set()
+                with self.lock:
+                    self.failed.append(confluence_node)
+            finally:
+                confluence_node.created.set()
+                confluence_node.release_content()
+                importer.metrics.page_done()
+                with self.lock:
+                    self.processed = self.processed + 1
+
+    def run(self, pages):
+        producer = threading.Thread(target=self.produce, args=(pages,), daemon=True)
+        producer.start()
+        consumers = [threading.Thread(target=self.consume, daemon=True) for worker in range(self.workers)]
+        for consumer in consumers:
+            consumer.start()
+        producer.join()
+        for consumer in consumers:
+            consumer.join()
+        return self.failed
@@ -0,0 +1,125 @@
+import atexit
+import contextlib
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+TEXT_FORMAT = '[%(asctime)s] %(module)-25s | %(levelname)-8s |  %(message)s'
+TEXT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_FORMATS = ('text', 'json')
+
+# per-file events logged for every image and attachment, thinned out by --log-sample
+SAMPLED_EVENTS = ('uploaded', 'already_uploaded', 'sent', 'image_optimized')
+
+# the page being imported by the current thread, see page_context
+current_page = contextvars.ContextVar('current_page', default=None)
+
+# attributes every LogRecord has; anything else was passed as extra or added by PageContextFilter
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', logging.INFO, '', 0, '', None, None))) | {'message', 'asctime',
+                                                                                              'taskName'}
+
+
+@contextlib.contextmanager
+def page_context(confluence_node):
+    """Tags every record logged by this thread meanwhile with the page's journal key, Guru ID and page ID."""
+    token = current_page.set(confluence_node)
+    try:
+        yield
+    finally:
+        current_page.reset(token)
+
+
+class PageContextFilter(logging.Filter):
+    def filter(self, record):
+        confluence_node = current_page.get()
+        if confluence_node is not None and not hasattr(record, 'key'):
+            record.key = confluence_node.key
+            record.title = confluence_node.title
+            if confluence_node.uuid:
+                record.guru_id = confluence_node.uuid
+            if confluence_node.exists:
+                record.page_id = confluence_node.id
+        return True
+
+
+class PayloadTruncationFilter(logging.Filter):
+    """Cuts records logged with extra={'payload': True} (request bodies, API responses) to max_chars."""
+
+    def __init__(self, max_chars):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record):
+        if self.max_chars > 0 and getattr(record, 'payload', False):
+            message = record.getMessage()
+            if len(message) > self.max_chars:
+                record.msg = '{} ... [{} characters truncated]'.format(message[:self.max_chars],
+                                                                      len(message) - self.max_chars)
+                record.args = None
+        return True
+
+
+class EventSampler(logging.Filter):
+    """Keeps the first and then every n-th INFO record of each SAMPLED_EVENTS event."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if self.every <= 1 or event not in SAMPLED_EVENTS or record.levelno > logging.INFO:
+            return True
+        with self.lock:
+            count = self.counts.get(event, 0)
+            self.counts[event] = count + 1
+        return count % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, module and message, plus the page context and extra fields."""
+
+    def format(self, record):
+        entry = {'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+                 'level': record.levelname, 'module': record.module, 'message': record.getMessage()}
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(log_file, quiet=False, log_format='text', payload_chars=2000, sample_every=1):
+    """Logs through a queue, so importing threads never wait for the disk; a listener thread writes the records."""
+    root = logging.getLogger()
+    if root.handlers:
+        # configured already, e.g. by an application using the package
+        return None
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT,
+                                                                                             TEXT_DATE_FORMAT))
+    handlers = [file_handler]
+    if not quiet:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, TEXT_DATE_FORMAT))
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    # applied by the thread that logs: the page context is only known there, and dropped records are never queued
+    queue_handler.addFilter(EventSampler(sample_every))
+    queue_handler.addFilter(PayloadTruncationFilter(payload_chars))
+    queue_handler.addFilter(PageContextFilter())
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    root.setLevel(logging.INFO)
+    root.addHandler(queue_handler)
+    return listener
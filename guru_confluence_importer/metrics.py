@@ -0,0 +1,131 @@
+import contextlib
+import sys
+import threading
+import time
+
+
+class Metrics:
+    """Thread-safe per-phase counters and latency histograms, HTTP status and retry totals of one run."""
+
+    BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.phases = {}
+        self.statuses = {}
+        self.retries = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.pages_total = 0
+        self.pages_done = 0
+
+    def record(self, phase, seconds, size=0, error=False):
+        with self.lock:
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = {'count': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'bytes': 0,
+                         'histogram': [0] * (len(Metrics.BUCKETS) + 1)}
+                self.phases[phase] = stats
+            stats['count'] = stats['count'] + 1
+            stats['errors'] = stats['errors'] + (1 if error else 0)
+            stats['seconds'] = stats['seconds'] + seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['bytes'] = stats['bytes'] + size
+            bucket = 0
+            while bucket < len(Metrics.BUCKETS) and seconds > Metrics.BUCKETS[bucket]:
+                bucket = bucket + 1
+            stats['histogram'][bucket] = stats['histogram'][bucket] + 1
+
+    @contextlib.contextmanager
+    def phase(self, phase, size=0):
+        started = time.monotonic()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.record(phase, time.monotonic() - started, size, error)
+
+    def record_request(self, status, size):
+        with self.lock:
+            self.requests = self.requests + 1
+            self.bytes_sent = self.bytes_sent + size
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def record_retry(self, category, delay):
+        with self.lock:
+            self.retries[category] = self.retries.get(category, 0) + 1
+        self.record('retry_wait', delay)
+
+    def add_pages(self, count):
+        with self.lock:
+            self.pages_total = self.pages_total + count
+
+    def page_done(self):
+        with self.lock:
+            self.pages_done = self.pages_done + 1
+
+    def summary(self):
+        with self.lock:
+            phases = {}
+            for phase, stats in self.phases.items():
+                labels = ['<=' + str(bound) for bound in Metrics.BUCKETS] + ['>' + str(Metrics.BUCKETS[-1])]
+                phases[phase] = {'count': stats['count'], 'errors': stats['errors'],
+                                 'seconds': round(stats['seconds'], 3),
+                                 'mean_seconds': round(stats['seconds'] / stats['count'], 4),
+                                 'max_seconds': round(stats['max_seconds'], 4), 'bytes': stats['bytes'],
+                                 'histogram': dict(zip(labels, stats['histogram']))}
+            return {'elapsed_seconds': round(time.monotonic() - self.started, 3),
+                    'pages_done': self.pages_done, 'pages_total': self.pages_total,
+                    'http': {'requests': self.requests, 'bytes_sent': self.bytes_sent,
+                             'statuses': {str(status): count for status, count in sorted(self.statuses.items(),
+                                                                                         key=str)},
+                             'retries': dict(self.retries)},
+                    'phases': phases}
+
+
+class ProgressReporter:
+    """Rewrites one status line on stderr with pages done, ETA and the current request rate."""
+
+    def __init__(self, metrics, interval=2.0):
+        self.metrics = metrics
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.last_requests = 0
+        self.last_time = time.monotonic()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.report()
+        sys.stderr.write('\n')
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def report(self):
+        now = time.monotonic()
+        metrics = self.metrics
+        with metrics.lock:
+            done = metrics.pages_done
+            total = metrics.pages_total
+            requests_sent = metrics.requests
+            retries = sum(metrics.retries.values())
+        request_rate = (requests_sent - self.last_requests) / max(now - self.last_time, 0.001)
+        self.last_requests = requests_sent
+        self.last_time = now
+        elapsed = now - metrics.started
+        if 0 < done < total:
+            eta = '{:.0f}s'.format(elapsed / done * (total - done))
+        else:
+            eta = '-'
+        sys.stderr.write('\rpages {}/{} | ETA {} | {:.1f} req/s | {} requests, {} retries   '.format(
+            done, total, eta, request_rate, requests_sent, retries))
+        sys.stderr.flush()
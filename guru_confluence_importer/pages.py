@@ -0,0 +1,281 @@
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
+
+from .client import ConfluenceError
+from .transform import GURU_LINK_PLACEHOLDER
+from .transform import transform_html
+
+
+# characters Confluence does not accept in label names
+LABEL_TRANSLATION = str.maketrans({character: "-" for character in ":;,.?&[]()#^*@! "})
+
+
+@functools.lru_cache(maxsize=None)
+def normalize_label(tag):
+    # collections reuse the same few hundred tags, each is translated once
+    return "{}".format(tag).translate(LABEL_TRANSLATION)
+
+
+def normalize_title(title):
+    return title.replace("&", " and ").encode("ascii", "ignore").decode()
+
+
+class TitlePlanner:
+    """Assigns unique titles in walk order, avoiding the titles already in the target space."""
+
+    def __init__(self, existing=None, owned=None):
+        # Confluence compares titles case-insensitively; existing maps title -> page ID, owned maps key -> page ID
+        self.taken = {normalize_title(title).casefold(): page_id for title, page_id in (existing or {}).items()}
+        self.owned = owned if owned is not None else {}
+        self.next_occurrence = {}
+        self.bases = {}
+        self.lock = threading.Lock()
+
+    def own(self, owned):
+        """Adds the pages another import into the same space created before, see BatchImporter."""
+        with self.lock:
+            self.owned.update(owned)
+
+    def available(self, title, owner):
+        holder = self.taken.get(title.casefold())
+        return holder is None or (owner is not None and holder == owner)
+
+    def assign(self, confluence_node):
+        """Gives the page its title, or the first free "(in multiple boards N)" variant of it."""
+        base = confluence_node.title
+        owner = self.owned.get(confluence_node.key)
+        with self.lock:
+            # pages imported before may keep their own title, so they search from the start
+            occurrence = 1 if owner is not None else self.next_occurrence.get(base.casefold(), 1)
+            while True:
+                title = base if occurrence == 1 else base + " (in multiple boards " + str(occurrence) + ")"
+                if self.available(title, owner):
+                    break
+                occurrence = occurrence + 1
+            self.next_occurrence[base.casefold()] = max(self.next_occurrence.get(base.casefold(), 1), occurrence + 1)
+            self.taken[title.casefold()] = owner if owner is not None else confluence_node.key
+            self.bases[confluence_node.key] = base
+        confluence_node.title = title
+
+    def reassign(self, confluence_node):
+        """Picks the next free variant after Confluence rejected a title created since the space was listed."""
+        with self.lock:
+            self.taken[confluence_node.title.casefold()] = 'rejected by Confluence'
+            base = self.bases.get(confluence_node.key, confluence_node.title)
+        confluence_node.title = base
+        self.assign(confluence_node)
+
+
+class CardLinkIndex:
+    """Guru card slugs and IDs -> pages of this import, used to turn links between cards into page links."""
+
+    def __init__(self):
+        self.pages = {}
+        # set once the whole collection was walked, before that an unknown card may still be read later
+        self.complete = False
+        self.deferred = []
+        self.lock = threading.Lock()
+
+    def add(self, confluence_node, definition):
+        for name in (definition.get('ID'), str(definition.get('Slug') or '').split('/')[0]):
+            if name:
+                self.pages[name] = confluence_node
+
+    def rewrite(self, content, title):
+        """Returns the body with every card link resolved, and the targets that were not read from the export yet."""
+        pending = []
+
+        def replace(match):
+            target = self.pages.get(match.group(1))
+            if target is not None:
+                # titles are planned up front, so a card that is not created yet already links to its final title
+                return '<ac:link><ri:page ri:content-title="{}"></ri:page><ac:link-body>{}</ac:link-body>' \
+                       '</ac:link>'.format(escape(target.title), match.group(3))
+            if self.complete:
+                logging.warning('WARNING - Card "{}" contains reference to getguru.com'.format(title))
+            else:
+                pending.append(match.group(1))
+            return '<a href="{}">{}</a>'.format(match.group(2), match.group(3))
+
+        return GURU_LINK_PLACEHOLDER.sub(replace, content), pending
+
+    def resolve(self, confluence_node, relink=False):
+        """Resolves the card links of a page body, returns what fix_up needs when a target may still change.
+
+        That is a card not read yet (--stream), or a card not created yet, which keeps its planned title unless
+        Confluence rejects it; fix_up only updates the page when the resolved body differs from the uploaded one.
+        With relink, e.g. after a failed link update, fix_up updates the page whatever was uploaded.
+        """
+        if len(confluence_node.links) == 0:
+            return None
+        placeholder = confluence_node.htmlContent
+        confluence_node._htmlContent, pending = self.rewrite(placeholder, confluence_node.title)
+        if relink:
+            return placeholder, None, pending
+        uncreated = any(not self.pages[name].exists for name in confluence_node.links if name in self.pages)
+        if len(pending) == 0 and not uncreated:
+            return None
+        return placeholder, confluence_node._htmlContent, pending
+
+    def defer(self, confluence_node, fix_up):
+        # only the bodies are kept, streamed pages release their converted body after the upload
+        with self.lock:
+            self.deferred.append((confluence_node,) + fix_up)
+        if len(fix_up[2]) > 0:
+            logging.info('LINKS DEFERRED ' + confluence_node.id)
+
+    def fix_up(self, client, space, journal=None, manifest=None, workers=1):
+        """Updates the pages that linked to cards which did not exist yet when they were uploaded.
+
+        Returns the journal keys of the pages whose update failed.
+        """
+        self.complete = True
+        with self.lock:
+            jobs = self.deferred
+            self.deferred = []
+        if len(jobs) == 0:
+            return []
+        failed = []
+
+        def update(job):
+            confluence_node, placeholder, uploaded, missing = job
+            # cards that are not part of this collection stay plain links and are reported by rewrite
+            content, pending = self.rewrite(placeholder, confluence_node.title)
+            if content == uploaded:
+                return False
+            try:
+                client.update_confluence_page(space, confluence_node.id, confluence_node.title, content,
+                                              confluence_node.version + 1)
+            except ConfluenceError:
+                # journaled for --resume; the manifest entry loses its hash, so the next --sync updates the page
+                logging.error('LINK UPDATE FAILED ' + confluence_node.id)
+                failed.append(confluence_node.key)
+                if journal is not None:
+                    journal.record('unlinked', confluence_node.key)
+                if manifest is not None:
+                    manifest.invalidate(confluence_node.key)
+                return False
+            confluence_node.version = confluence_node.version + 1
+            logging.info('UPDATED LINKS ' + confluence_node.id)
+            if journal is not None:
+                journal.record('updated', confluence_node.key, version=confluence_node.version)
+                if confluence_node.key in journal.unlinked:
+                    journal.record('linked', confluence_node.key)
+            if manifest is not None:
+                manifest.update_version(confluence_node.key, confluence_node.version)
+            return True
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            updated = sum(1 for result in executor.map(update, jobs) if result)
+        logging.info('LINKED {} pages in {:.2f}s'.format(updated, time.monotonic() - started))
+        return failed
+
+
+class ConfluencePage:
+    def __init__(self, title, page_id="", parent_id="", html_content="", uuid=""):
+        self.parentId = parent_id
+        self.id = page_id
+        self.images = []
+        self.attachments = []
+        self.links = []
+        self.exists = False
+        self.set_content(html_content)
+        self.update_title(title)
+        self.children = []
+        self.uuid = uuid
+        self.key = uuid
+        self.child_keys = {}
+        self.labelsMetadata = None
+        # files known to be attached to the page (or the shared assets page), recorded in the manifest
+        self.uploadedFiles = set()
+        self.sourceHash = None
+        self.version = 1
+        self.parent = None
+        self.created = None
+        self.failed = False
+
+    def add_child(self, confluencePage, keep=True):
+        # the journal key is the path of Guru IDs (or section titles) from the root, unique among siblings
+        key = self.key + "/" + (confluencePage.uuid if confluencePage.uuid else confluencePage.title)
+        occurrence = self.child_keys.get(key, 0) + 1
+        self.child_keys[key] = occurrence
+        confluencePage.key = key if occurrence == 1 else key + "#" + str(occurrence)
+        confluencePage.parent = self
+        if keep:
+            self.children.append(confluencePage)
+
+    def set_parent(self, parent_id):
+        self.parentId = parent_id
+
+    def set_id(self, page_id):
+        self.id = page_id
+        self.exists = True
+        for child in self.children:
+            child.set_parent(self.id)
+
+    def set_content(self, content, prefix=""):
+        # conversion is deferred until the body is needed, so placeholder content is never parsed
+        self.pendingContent = content
+        self.contentPrefix = prefix
+
+    def set_rendered(self, result, prefix=""):
+        # body already converted by the export loader
+        self.pendingContent = None
+        self._htmlContent = prefix + result.content
+        self.images = result.images
+        self.attachments = result.attachments
+        self.links = result.links
+
+    def render(self, parser='html.parser', aliases=None, asset_page=None):
+        if self.pendingContent is not None:
+            result = transform_html(self.pendingContent, self.title, parser, aliases, asset_page)
+            self._htmlContent = self.contentPrefix + result.content
+            self.images = result.images
+            self.attachments = result.attachments
+            self.links = result.links
+            self.pendingContent = None
+
+    def release_content(self):
+        self.pendingContent = None
+        self._htmlContent = None
+        self.images = []
+        self.attachments = []
+        self.links = []
+        self.uploadedFiles = set()
+
+    @property
+    def htmlContent(self):
+        self.render()
+        return self._htmlContent
+
+    def fingerprint(self):
+        # cards hash their Guru source in fill_card; other pages are compared by what they would upload
+        if self.sourceHash is None:
+            self.sourceHash = hashlib.sha256((self.title + "\n" + self.htmlContent).encode("utf-8")).hexdigest()
+        return self.sourceHash
+
+    def update_title(self, title):
+        # made unique in the space later by the TitlePlanner, placeholder titles never reserve a name
+        self.title = normalize_title(title)
+
+    def update_labels(self, tags):
+        if tags is None:
+            self.labelsMetadata = None
+        else:
+            self.labelsMetadata = [{"prefix": "global", "name": normalize_label(label)} for label in tags]
+
+    def to_dict(self):
+        # built directly, the page links back to its parent so its __dict__ cannot be serialized
+        return {"title": self.title, "id": self.id, "parent": self.parentId,
+                "children": [child.to_dict() for child in self.children], "images": list(self.images)}
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
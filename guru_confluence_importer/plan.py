@@ -0,0 +1,169 @@
+import json
+import math
+
+from html import escape
+
+from .pages import ConfluencePage
+from .pages import normalize_title
+from .transform import TransformResult
+from .uploads import split_batches
+
+PLAN_VERSION = 1
+
+# compile options recorded in the plan; the ones in PLAN_CHECKED decide page keys and where files are uploaded,
+# so an --execute-plan run has to use the same
+PLAN_OPTIONS = ('root_key', 'attachment_strategy', 'assets_title', 'html_parser', 'date_disclaimer')
+PLAN_CHECKED = ('root_key', 'attachment_strategy')
+
+
+class PlanEstimator:
+    """Counts the requests and bytes each planned page costs, following what Importer.create_node sends."""
+
+    def __init__(self, config, source, index=None, resource_dir='resources'):
+        self.config = config
+        self.source = source
+        self.index = index
+        self.resource_dir = resource_dir
+        self.uploaded = set()
+        # the title listing, plus the shared assets page
+        self.requests = 1 + (1 if config.attachment_strategy == 'shared' else 0)
+        self.bytes = 0
+        self.upload_bytes = 0
+        self.files = 0
+        self.pages = 0
+
+    def files_of(self, confluence_node):
+        """The (file name, kind, size) uploads of a page that are not already on their target page."""
+        files = []
+        seen = set()
+        for file_name, kind in [(image, 'IMAGE') for image in confluence_node.images] + \
+                               [(attachment, 'ATTACHMENT') for attachment in confluence_node.attachments]:
+            file_path = self.resource_dir + "/" + file_name
+            if file_name in seen or not self.source.is_file(file_path):
+                continue
+            seen.add(file_name)
+            size = self.source.size(file_path)
+            if self.index is not None:
+                # dedup uploads each content once per page, shared once for the whole import
+                target = 'assets' if self.config.attachment_strategy == 'shared' else confluence_node.key
+                cache_key = (self.index.file_hash(file_name), target)
+                if cache_key in self.uploaded:
+                    continue
+                self.uploaded.add(cache_key)
+            files.append((file_name, kind, size))
+        return files
+
+    def page(self, confluence_node, files):
+        config = self.config
+        body = len(confluence_node.htmlContent.encode('utf-8'))
+        requests = 1
+        size = body
+        if config.migrate_tags and confluence_node.labelsMetadata is not None and config.labels_mode != 'inline':
+            requests = requests + 1
+            size = size + len(json.dumps(confluence_node.labelsMetadata))
+        batches = split_batches([(name, kind, None, file_size) for name, kind, file_size in files],
+                                config.upload_batch_files, config.upload_batch_mb * 1024 * 1024)
+        upload_bytes = sum(file_size for name, kind, file_size in files)
+        requests = requests + len(batches)
+        size = size + upload_bytes
+        if (len(confluence_node.images) > 0 or len(confluence_node.attachments) > 0) and not config.single_write:
+            requests = requests + 1
+            size = size + body
+        self.pages = self.pages + 1
+        self.requests = self.requests + requests
+        self.bytes = self.bytes + size
+        self.upload_bytes = self.upload_bytes + upload_bytes
+        self.files = self.files + len(files)
+        return requests, size
+
+    def summary(self):
+        return {'pages': self.pages, 'requests': self.requests, 'bytes': self.bytes, 'files': self.files,
+                'upload_bytes': self.upload_bytes, 'max_rate': self.config.max_rate,
+                'estimated_seconds': math.ceil(self.requests / self.config.max_rate) if self.config.max_rate > 0
+                else None}
+
+
+class PlanWriter:
+    """Writes a plan as JSON lines: the compile options, one record per page in creation order, then the totals."""
+
+    def __init__(self, path, config):
+        self.file = open(path, 'w', encoding='utf-8')
+        options = {option: getattr(config, option) for option in PLAN_OPTIONS}
+        self.write({'plan': PLAN_VERSION, 'options': options})
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def page(self, confluence_node, files, card, cost):
+        record = {'key': confluence_node.key, 'parent': confluence_node.parent.key, 'title': confluence_node.title,
+                  'labels': [label['name'] for label in confluence_node.labelsMetadata]
+                  if confluence_node.labelsMetadata is not None else None,
+                  'files': [{'name': name, 'kind': kind, 'size': size} for name, kind, size in files],
+                  'images': confluence_node.images, 'attachments': confluence_node.attachments,
+                  'links': confluence_node.links, 'body': confluence_node.htmlContent,
+                  'requests': cost[0], 'bytes': cost[1]}
+        if confluence_node.sourceHash is not None:
+            record['hash'] = confluence_node.sourceHash
+        if card is not None:
+            record['card'] = {'ID': card.get('ID'), 'Slug': card.get('Slug')}
+        self.write(record)
+
+    def close(self, summary):
+        self.write({'summary': summary})
+        self.file.close()
+
+
+class PlanReader:
+    """Reads a plan written by PlanWriter one record at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+        if header.get('plan') != PLAN_VERSION:
+            raise ValueError('{} is not a version {} import plan'.format(path, PLAN_VERSION))
+        self.options = header['options']
+        self.summary = None
+
+    def check(self, config):
+        """Raises ValueError when the configuration differs from the options the plan was compiled with."""
+        different = [option for option in PLAN_CHECKED if getattr(config, option) != self.options[option]]
+        if len(different) > 0:
+            raise ValueError('{} was compiled with different options: {}'.format(
+                self.path, ', '.join('{}={!r}'.format(option, self.options[option]) for option in different)))
+
+    def records(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                record = json.loads(line)
+                if 'summary' in record:
+                    self.summary = record['summary']
+                    return
+                yield record
+
+    def pages(self, root_node, asset_page_title=None):
+        """Yields the planned pages as ConfluencePage objects with their converted bodies, parent first."""
+        nodes = {root_node.key: root_node}
+        planned_asset_title = normalize_title(self.options['assets_title'])
+        for record in self.records():
+            parent = nodes[record['parent']]
+            confluence_node = ConfluencePage(record['title'], "-1", parent.id)
+            confluence_node.key = record['key']
+            confluence_node.parent = parent
+            parent.children.append(confluence_node)
+            result = TransformResult(record['title'])
+            result.content = record['body']
+            if asset_page_title is not None and asset_page_title != planned_asset_title:
+                # the space already had a page with the planned assets title
+                result.content = result.content.replace(
+                    'ri:content-title="{}"'.format(escape(planned_asset_title, quote=False)),
+                    'ri:content-title="{}"'.format(escape(asset_page_title, quote=False)))
+            result.images = record['images']
+            result.attachments = record['attachments']
+            result.links = record['links']
+            confluence_node.set_rendered(result)
+            confluence_node.update_labels(record['labels'])
+            confluence_node.sourceHash = record.get('hash')
+            nodes[confluence_node.key] = confluence_node
+            yield confluence_node, record.get('card')
@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import threading
+
+
+class ImportJournal:
+    """Append-only JSON lines record of finished import steps, replayed by --resume to skip finished work."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.pages = {}
+        self.titles = {}
+        # key -> title of every create request sent; without a created entry the run stopped before the answer
+        self.creating = {}
+        self.uploads = {}
+        self.labelled = set()
+        self.updated = set()
+        self.versions = {}
+        self.done = set()
+        # finished pages whose link fix-up failed
+        self.unlinked = set()
+        # files attached to each finished page, for the manifest
+        self.files = {}
+        self.lock = threading.Lock()
+        if resume and os.path.isfile(path):
+            self._replay()
+        self.file = open(path, "a" if resume else "w")
+
+    def _replay(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line may be cut short if the previous run died while writing it
+                    continue
+                self._apply(entry)
+        logging.info('RESUMING from journal {} ({} pages created, {} finished)'.format(self.path, len(self.pages),
+                                                                                    len(self.done)))
+
+    def _apply(self, entry):
+        key = entry['key']
+        if entry['event'] == 'creating':
+            self.creating[key] = entry['title']
+        elif entry['event'] == 'created':
+            self.pages[key] = entry['page_id']
+            self.titles[key] = entry['title']
+        elif entry['event'] == 'labelled':
+            self.labelled.add(key)
+        elif entry['event'] == 'uploaded':
+            self.uploads.setdefault(key, set()).add(entry['file'])
+        elif entry['event'] == 'updated':
+            self.updated.add(key)
+            self.versions[key] = entry['version']
+        elif entry['event'] == 'unlinked':
+            self.unlinked.add(key)
+        elif entry['event'] == 'linked':
+            self.unlinked.discard(key)
+        elif entry['event'] == 'done':
+            self.done.add(key)
+            self.files[key] = entry.get('files', [])
+
+    def record(self, event, key, **fields):
+        entry = dict(fields, event=event, key=key)
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            self._apply(entry)
+
+    def is_uploaded(self, key, file_name):
+        return file_name in self.uploads.get(key, ())
+
+    def close(self):
+        self.file.close()
+
+
+class SyncManifest:
+    """Per-page state of the last import (page ID, version, source hash, files), used by --sync to push only changes."""
+
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.previous = {}
+        self.entries = {}
+        self.lock = threading.Lock()
+        if sync:
+            if os.path.isfile(path):
+                with open(path, "r") as f:
+                    self.previous = json.load(f)
+                logging.info('SYNCING against manifest {} ({} pages)'.format(path, len(self.previous)))
+            else:
+                logging.warning('WARNING no manifest found at {}, every page will be created'.format(path))
+
+    def record(self, confluence_node, complete=True):
+        # an incomplete page keeps its ID but no hash or labels, so the next --sync writes it again
+        entry = {"page_id": confluence_node.id, "version": confluence_node.version, "title": confluence_node.title,
+                 "hash": confluence_node.fingerprint() if complete else None,
+                 "labels": confluence_node.labelsMetadata if complete else None,
+                 "files": sorted(confluence_node.uploadedFiles)}
+        with self.lock:
+            self.entries[confluence_node.key] = entry
+
+    def keep(self, key):
+        with self.lock:
+            self.entries[key] = self.previous[key]
+
+    def invalidate(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]["hash"] = None
+                self.entries[key]["labels"] = None
+
+    def update_version(self, key, version):
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]["version"] = version
+
+    def save(self):
+        # pages of the previous run that were not touched this time (e.g. failed subtrees) stay in the manifest
+        merged = dict(self.previous)
+        merged.update(self.entries)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(merged, f)
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,236 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+
+class ConfluenceStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        raw = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length > 0 else b''
+
+    def handle_request(self, method):
+        stub = self.server.stub
+        body = self.read_body()
+        url = urlparse(self.path)
+        endpoint = method + ' ' + re.sub(r'/content/[^/]+', '/content/{id}', url.path)
+        stub.count(endpoint, len(body))
+
+        if url.path == '/_stub/stats':
+            return self.send_json(200, stub.stats())
+        if stub.latency > 0:
+            time.sleep(stub.latency)
+        if stub.throttle_rate > 0 and random.random() < stub.throttle_rate:
+            stub.count('throttled', 0)
+            return self.send_json(429, {'statusCode': 429, 'message': 'Rate limit exceeded'},
+                                  {'Retry-After': str(stub.retry_after)})
+
+        match = re.match(r'^/wiki/rest/api/content(?:/([^/]+))?(/label|/child/attachment)?$', url.path)
+        if match is None:
+            return self.send_json(404, {'statusCode': 404, 'message': 'No such endpoint ' + url.path})
+        page_id, action = match.groups()
+        if page_id is None and method == 'POST':
+            status, response = stub.create_page(json.loads(body))
+        elif page_id is None and method == 'GET':
+            status, response = stub.list_pages(parse_qs(url.query))
+        elif action is None and method == 'PUT':
+            status, response = stub.update_page(page_id, json.loads(body))
+        elif action is None and method == 'GET':
+            status, response = stub.get_page(page_id)
+        elif action == '/label' and method == 'POST':
+            status, response = stub.add_labels(page_id, json.loads(body))
+        elif action == '/child/attachment' and method == 'POST':
+            status, response = stub.add_attachments(page_id, body)
+        else:
+            status, response = 405, {'statusCode': 405, 'message': method + ' not supported on ' + url.path}
+        self.send_json(status, response)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+
+class ConfluenceStub:
+    """In-memory stand-in for the Confluence Cloud content, label and attachment endpoints used by the importer."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, throttle_rate=0.0, retry_after=1, lost_create_rate=0.0):
+        self.latency = latency
+        # fraction of page creations answered with 500 although the page was created, like a timed out request
+        self.lost_create_rate = lost_create_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.server = ThreadingHTTPServer((host, port), ConfluenceStubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+        self.lock = threading.Lock()
+        self.next_id = 100000
+        self.pages = {}
+        self.titles = {}
+        self.requests = {}
+        self.bytes_received = 0
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/wiki'.format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, endpoint, size):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_received = self.bytes_received + size
+
+    def stats(self):
+        with self.lock:
+            return {'pages': len(self.pages), 'requests': dict(self.requests),
+                    'total_requests': sum(count for endpoint, count in self.requests.items()
+                                          if endpoint != 'throttled' and not endpoint.endswith('/_stub/stats')),
+                    'bytes_received': self.bytes_received,
+                    'attachments': sum(len(page['attachments']) for page in self.pages.values())}
+
+    def create_page(self, data):
+        space = data['space']['key']
+        with self.lock:
+            if (space, data['title']) in self.titles:
+                return 400, {'statusCode': 400,
+                             'message': 'A page already exists with the same TITLE in this space'}
+            self.next_id = self.next_id + 1
+            page = {'id': str(self.next_id), 'type': 'page', 'status': 'current', 'title': data['title'],
+                    'space': {'key': space}, 'ancestors': data.get('ancestors', []), 'body': data['body'],
+                    'version': {'number': 1}, 'labels': [], 'attachments': []}
+            for label in data.get('metadata', {}).get('labels', []):
+                page['labels'].append(label['name'])
+            self.pages[page['id']] = page
+            self.titles[(space, page['title'])] = page['id']
+        if self.lost_create_rate > 0 and random.random() < self.lost_create_rate:
+            return 500, {'statusCode': 500, 'message': 'Internal server error'}
+        return 200, page
+
+    def update_page(self, page_id, data):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return 404, {'statusCode': 404, 'message': 'No content with id ' + page_id}
+            if data['version']['number'] != page['version']['number'] + 1:
+                return 409, {'statusCode': 409, 'message': 'Version must be incremented on update. Current version '
+                                                           'is: ' + str(page['version']['number'])}
+            del self.titles[(page['space']['key'], page['title'])]
+            page['title'] = data['title']
+            page['body'] = data['body']
+            page['version'] = {'number': data['version']['number']}
+            self.titles[(page['space']['key'], page['title'])] = page_id
+        return 200, page
+
+    def get_page(self, page_id):
+        with self.lock:
+            page = self.pages.get(page_id)
+        if page is None:
+            return 404, {'statusCode': 404, 'message': 'No content with id ' + page_id}
+        return 200, page
+
+    def list_pages(self, query):
+        space = query.get('spaceKey', [None])[0]
+        title = query.get('title', [None])[0]
+        start = int(query.get('start', ['0'])[0])
+        limit = int(query.get('limit', ['25'])[0])
+        with self.lock:
+            pages = [page for page in self.pages.values() if (space is None or page['space']['key'] == space) and
+                     (title is None or page['title'] == title)]
+        if 'expand' in query:
+            results = pages[start:start + limit]
+        else:
+            results = [{'id': page['id'], 'type': 'page', 'title': page['title']}
+                       for page in pages[start:start + limit]]
+        response = {'results': results, 'start': start, 'limit': limit, 'size': len(results), '_links': {}}
+        if start + limit < len(pages):
+            response['_links']['next'] = '/rest/api/content?spaceKey={}&type=page&start={}&limit={}'.format(
+                space, start + limit, limit)
+        return 200, response
+
+    def add_labels(self, page_id, labels):
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return 404, {'statusCode': 404, 'message': 'No content with id ' + page_id}
+            for label in labels:
+                if label['name'] not in page['labels']:
+                    page['labels'].append(label['name'])
+            results = [{'prefix': 'global', 'name': name} for name in page['labels']]
+        return 200, {'results': results, 'size': len(results)}
+
+    def add_attachments(self, page_id, body):
+        file_names = [name.decode('utf-8') for name in re.findall(rb'filename="([^"]*)"', body)]
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return 404, {'statusCode': 404, 'message': 'No content with id ' + page_id}
+            for file_name in file_names:
+                if file_name in page['attachments']:
+                    return 400, {'statusCode': 400, 'message': 'Cannot add a new attachment with same file name as '
+                                                               'an existing attachment: ' + file_name}
+            page['attachments'].extend(file_names)
+        results = [{'id': 'att' + page_id + '-' + file_name, 'type': 'attachment', 'title': file_name}
+                   for file_name in file_names]
+        return 200, {'results': results, 'size': len(results)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Confluence Cloud REST API.')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8090, help='port to listen on (default: 8090)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response (default: 0)')
+    parser.add_argument('--throttle-rate', dest='throttlerate', type=float, default=0.0,
+                        help='fraction of requests answered with 429 Too Many Requests (default: 0)')
+    parser.add_argument('--retry-after', dest='retryafter', type=int, default=1,
+                        help='Retry-After seconds sent with every 429 (default: 1)')
+    parser.add_argument('--lost-create-rate', dest='lostcreaterate', type=float, default=0.0,
+                        help='fraction of page creations answered with 500 after creating the page (default: 0)')
+    args = parser.parse_args(argv)
+
+    stub = ConfluenceStub(args.host, args.port, args.latency, args.throttlerate, args.retryafter, args.lostcreaterate)
+    print('Confluence stub listening on ' + stub.url + ' (statistics at /_stub/stats)')
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import logging
+import os
+import re
+
+from bs4 import BeautifulSoup
+
+
+def get_element_attribute(element, attribute_name, default_value=''):
+    try:
+        result = element[attribute_name]
+    except:
+        result = default_value
+    return result
+
+
+class TransformResult:
+    def __init__(self, title, aliases=None, asset_page=None):
+        self.title = title
+        self.aliases = aliases if aliases is not None else {}
+        self.asset_page = asset_page
+        self.content = ""
+        self.images = []
+        self.attachments = []
+        self.links = []
+
+    def attachment_reference(self, soup, src):
+        # files with identical content are referenced by one canonical name, optionally on the shared assets page
+        filename = os.path.basename(src)
+        filename = self.aliases.get(filename, filename)
+        ri_attachment = soup.new_tag('ri:attachment')
+        ri_attachment['ri:filename'] = filename
+        if self.asset_page is not None:
+            ri_page = soup.new_tag('ri:page')
+            ri_page['ri:content-title'] = self.asset_page
+            ri_attachment.append(ri_page)
+        return filename, ri_attachment
+
+
+# part of every body cache key, bump it when a rule changes the bodies transform_html produces
+TRANSFORM_VERSION = 1
+
+# tag name -> rules applied to each such element; a rule returns True when it replaced the element
+TRANSFORM_RULES = {}
+
+# the card slug or ID in links like https://app.getguru.com/card/iXyzAbcT/Card-Title
+GURU_CARD_LINK = re.compile(r'getguru\.com/card/([^/?#"]+)')
+
+# a card link as serialized by transform_guru_link, before CardLinkIndex resolved its target
+GURU_LINK_PLACEHOLDER = re.compile(r'<ac:link data-guru-card="([^"]*)" data-guru-href="([^"]*)">'
+                                   r'<ri:page ri:content-title=""></ri:page><ac:link-body>(.*?)</ac:link-body>'
+                                   r'</ac:link>', re.DOTALL)
+
+
+def transform_rule(tag_name):
+    def register(rule):
+        TRANSFORM_RULES.setdefault(tag_name, []).append(rule)
+        return rule
+
+    return register
+
+
+@transform_rule('hr')
+def transform_ruler(soup, ruler, result):
+    ruler.replace_with(soup.new_tag('hr'))
+    return True
+
+
+@transform_rule('iframe')
+def transform_iframe(soup, iframe, result):
+    src = get_element_attribute(iframe, 'src', '')
+    width = get_element_attribute(iframe, 'width', '100%')
+    height = get_element_attribute(iframe, 'height', '630')
+    iframe_new = soup.new_tag('ac:structured-macro')
+    iframe_new['ac:name'] = 'iframe'
+    iframe_new['ac:schema-version'] = '1'
+    iframe_new['data-layout'] = 'default'
+    iframe_new_param1 = soup.new_tag('ac:parameter')
+    iframe_new_param1['ac:name'] = 'src'
+    iframe_new_param1_url = soup.new_tag('ri:url')
+    iframe_new_param1_url['ri:value'] = src
+    iframe_new_param1.append(iframe_new_param1_url)
+    iframe_new.append(iframe_new_param1)
+    iframe_new_param2 = soup.new_tag('ac:parameter')
+    iframe_new_param2['ac:name'] = 'width'
+    iframe_new_param2.string = width
+    iframe_new.append(iframe_new_param2)
+    iframe_new_param3 = soup.new_tag('ac:parameter')
+    iframe_new_param3['ac:name'] = 'height'
+    iframe_new_param3.string = height
+    iframe_new.append(iframe_new_param3)
+    iframe.replace_with(iframe_new)
+    return True
+
+
+@transform_rule('img')
+def transform_image(soup, img, result):
+    src = get_element_attribute(img, 'src', '')
+    if src == '':
+        return False
+    filename, ri_attachment = result.attachment_reference(soup, src)
+    result.images.append(filename)
+    ac_image = soup.new_tag('ac:image')
+    ac_image.append(ri_attachment)
+    img.replace_with(ac_image)
+    return True
+
+
+@transform_rule('a')
+def transform_resource_link(soup, attachment, result):
+    href = get_element_attribute(attachment, 'href', '')
+    if not href.startswith('resources/'):
+        return False
+    filename, attachment_new_ri = result.attachment_reference(soup, href)
+    result.attachments.append(filename)
+    attachment_new = soup.new_tag('ac:structured-macro')
+    attachment_new['ac:name'] = 'view-file'
+    attachment_new_param1 = soup.new_tag('ac:parameter')
+    attachment_new_param1['ac:name'] = 'name'
+    attachment_new_param1.append(attachment_new_ri)
+    attachment_new.append(attachment_new_param1)
+    attachment.replace_with(attachment_new)
+    return True
+
+
+@transform_rule('a')
+def transform_guru_link(soup, link, result):
+    href = get_element_attribute(link, 'href', '')
+    if 'getguru.com' not in href:
+        return False
+    match = GURU_CARD_LINK.search(href)
+    if match is None:
+        logging.warning('WARNING - Card "{}" contains reference to getguru.com'.format(result.title))
+        return False
+    # the target title is only known once the whole collection is planned, CardLinkIndex fills it in before upload
+    ac_link = soup.new_tag('ac:link')
+    ac_link['data-guru-card'] = match.group(1)
+    ac_link['data-guru-href'] = href
+    ri_page = soup.new_tag('ri:page')
+    ri_page['ri:content-title'] = ''
+    ac_link.append(ri_page)
+    link_body = soup.new_tag('ac:link-body')
+    for child in list(link.contents):
+        link_body.append(child.extract())
+    ac_link.append(link_body)
+    link.replace_with(ac_link)
+    result.links.append(match.group(1))
+    return True
+
+
+def transform_html(content, title="", parser='html.parser', aliases=None, asset_page=None):
+    """Parses the HTML once, applies every registered rule in document order and serializes once."""
+    soup = BeautifulSoup(content, parser)
+    result = TransformResult(title, aliases, asset_page)
+    for element in soup.find_all(list(TRANSFORM_RULES.keys())):
+        for rule in TRANSFORM_RULES[element.name]:
+            if rule(soup, element, result):
+                break
+    # lxml wraps fragments in <html><body>, only the fragment belongs in the page body
+    if soup.body is not None and parser != 'html.parser':
+        result.content = "".join(str(child) for child in soup.body.contents)
+    else:
+        result.content = str(soup)
+    return result
@@ -0,0 +1,221 @@
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import ConfluenceError
+
+
+def split_batches(items, batch_files, batch_bytes):
+    """Groups (file name, kind, cache key, size) items into upload requests, a file larger than a batch goes alone."""
+    batches = []
+    batch = []
+    batch_size = 0
+    for item in items:
+        if len(batch) > 0 and (len(batch) >= batch_files or batch_size + item[3] > batch_bytes):
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+        batch.append(item)
+        batch_size = batch_size + item[3]
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+class ResourceIndex:
+    """Content hashes of the exported resources/ files, mapping files with identical content to one canonical name."""
+
+    def __init__(self, source, resource_dir='resources'):
+        self.source = source
+        self.resource_dir = resource_dir
+        self.hashes = {}
+        self.aliases = {}
+        self.lock = threading.Lock()
+
+    def file_hash(self, file_name):
+        with self.lock:
+            if file_name in self.hashes:
+                return self.hashes[file_name]
+        file_path = self.resource_dir + "/" + file_name
+        if not self.source.is_file(file_path):
+            return None
+        digest = hashlib.sha256()
+        with self.source.open(file_path) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        with self.lock:
+            self.hashes[file_name] = digest.hexdigest()
+        return self.hashes[file_name]
+
+    def build(self, workers=8):
+        file_names = sorted(self.source.list(self.resource_dir))
+        if len(file_names) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hashes = list(executor.map(self.file_hash, file_names))
+        canonical_names = {}
+        for file_name, content_hash in zip(file_names, hashes):
+            if content_hash is None:
+                continue
+            canonical_name = canonical_names.setdefault(content_hash, file_name)
+            if canonical_name != file_name:
+                self.aliases[file_name] = canonical_name
+        logging.info('INDEXED {} resources, {} duplicates'.format(len(file_names), len(self.aliases)))
+
+
+class AttachmentUploader:
+    """Uploads page files in streamed batches, skipping content already uploaded to the same or the shared page."""
+
+    def __init__(self, client, source, strategy='page', journal=None, batch_files=10,
+                 batch_bytes=50 * 1024 * 1024, workers=1, resource_dir='resources', upload_source=None, page_workers=1):
+        self.client = client
+        self.source = source
+        # what is sent, e.g. an OptimizedImageSource; duplicates are still detected on the exported content
+        self.upload_source = upload_source if upload_source is not None else source
+        self.resource_dir = resource_dir
+        self.strategy = strategy
+        self.journal = journal
+        self.batch_files = batch_files
+        self.batch_bytes = batch_bytes
+        # workers batches per page, for each of the page_workers pages uploading at the same time
+        self.executor = ThreadPoolExecutor(max_workers=workers * page_workers) if workers > 1 else None
+        self.index = ResourceIndex(source, resource_dir) if strategy != 'page' else None
+        self.assets_page = None
+        self.uploaded = set()
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def target(self, confluence_node):
+        return self.assets_page if self.strategy == 'shared' else confluence_node
+
+    def seed(self, confluence_node, file_names):
+        # files a previous run already uploaded to the target page
+        target = self.target(confluence_node)
+        for file_name in file_names:
+            if self.index is not None:
+                self.uploaded.add((self.index.file_hash(file_name), target.id))
+
+    def upload(self, confluence_node, files):
+        """Uploads (file name, kind) pairs for a page, batched by file count and size and optionally in parallel.
+
+        Adds every file that is attached now or was before to confluence_node.uploadedFiles, returns the names of
+        the files that failed to upload.
+        """
+        target = self.target(confluence_node)
+        pending = []
+        seen = set()
+        for file_name, kind in files:
+            if file_name in seen:
+                continue
+            seen.add(file_name)
+            if self.journal is not None and self.journal.is_uploaded(target.key, file_name):
+                confluence_node.uploadedFiles.add(file_name)
+                continue
+            file_path = self.resource_dir + "/" + file_name
+            if not self.source.is_file(file_path):
+                logging.warning(kind + ' NOT FOUND ' + file_name)
+                continue
+            cache_key = None
+            if self.index is not None:
+                cache_key = (self.index.file_hash(file_name), target.id)
+                with self.lock:
+                    if cache_key in self.uploaded:
+                        logging.info(kind + ' ALREADY UPLOADED ' + file_name,
+                                     extra={'event': 'already_uploaded', 'file': file_name})
+                        confluence_node.uploadedFiles.add(file_name)
+                        continue
+                    self.uploaded.add(cache_key)
+            pending.append((file_name, kind, cache_key, self.upload_source.size(file_path)))
+
+        batches = split_batches(pending, self.batch_files, self.batch_bytes)
+        if self.executor is None or len(batches) < 2:
+            results = [self.upload_batch(target, batch) for batch in batches]
+        else:
+            # every batch runs in a copy of this thread's context, so its log records keep the page fields
+            jobs = [(contextvars.copy_context(), batch) for batch in batches]
+            results = list(self.executor.map(lambda job: job[0].run(self.upload_batch, target, job[1]), jobs))
+        failed = []
+        for batch, uploaded in zip(batches, results):
+            for item in batch:
+                if uploaded:
+                    confluence_node.uploadedFiles.add(item[0])
+                else:
+                    failed.append(item[0])
+        return failed
+
+    def upload_batch(self, target, batch):
+        try:
+            self.client.upload_attachments_for_confluence_page(target.id, [item[0] for item in batch],
+                                                               self.upload_source, self.resource_dir,
+                                                               self.report_progress)
+        except ConfluenceError:
+            for file_name, kind, cache_key, size in batch:
+                logging.error(kind + ' UPLOAD FAILED ' + file_name)
+                if cache_key is not None:
+                    with self.lock:
+                        self.uploaded.discard(cache_key)
+            return False
+        for file_name, kind, cache_key, size in batch:
+            logging.info(kind + ' UPLOADED ' + file_name, extra={'event': 'uploaded', 'file': file_name})
+            if self.journal is not None:
+                self.journal.record('uploaded', target.key, file=file_name)
+        return True
+
+    def report_progress(self, file_name, size, seconds):
+        logging.info('SENT {} ({} bytes, {:.1f} KB/s)'.format(file_name, size, size / 1024.0 / max(seconds, 0.001)),
+                     extra={'event': 'sent', 'file': file_name})
+
+
+class LabelWriter:
+    """Applies page labels right away, or collects them and applies them concurrently once every page exists."""
+
+    def __init__(self, client, mode='separate', journal=None, workers=1):
+        self.client = client
+        self.mode = mode
+        self.journal = journal
+        self.workers = workers
+        self.deferred = []
+        self.lock = threading.Lock()
+
+    def apply(self, confluence_node):
+        """Returns False when the labels could not be written; deferred labels fail later, in flush."""
+        # only the page ID, key and labels are kept, streamed pages release everything else after their upload
+        job = (confluence_node.id, confluence_node.key, confluence_node.labelsMetadata)
+        if self.mode == 'deferred':
+            with self.lock:
+                self.deferred.append(job)
+            logging.info('LABELS DEFERRED ' + confluence_node.id)
+            return True
+        return self.write(job)
+
+    def write(self, job):
+        page_id, key, labels = job
+        try:
+            self.client.update_confluence_page_labels(page_id, labels)
+        except ConfluenceError:
+            logging.error('LABELS FAILED ' + page_id)
+            return False
+        logging.info('UPDATED LABELS ' + page_id)
+        if self.journal is not None:
+            self.journal.record('labelled', key)
+        return True
+
+    def flush(self):
+        """Writes the deferred labels, returns the journal keys of the pages whose labels failed."""
+        with self.lock:
+            jobs = self.deferred
+            self.deferred = []
+        if len(jobs) == 0:
+            return []
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.write, jobs))
+        logging.info('LABELLED {} pages in {:.2f}s'.format(len(jobs), time.monotonic() - started))
+        return [key for (page_id, key, labels), written in zip(jobs, results) if not written]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+import yaml
+
+from guru_confluence_importer.config import ImportConfig
+from guru_confluence_importer.stub import ConfluenceStub
+
+CARDS = {
+    'card1': ('Welcome', '<p>Hello</p><img src="resources/logo.png"/>'),
+    'card2': ('Setup', '<p>See <a href="https://app.getguru.com/card/slug-card1/Welcome">welcome</a></p><hr/>'),
+    'card3': ('FAQ', '<p>Questions</p><a href="resources/faq.pdf">faq</a>'),
+    # same title as card1, gets a "(in multiple boards 2)" variant
+    'card4': ('Welcome', '<p>Again</p>'),
+}
+
+
+def write_yaml(path, content):
+    with open(path, 'w') as f:
+        yaml.safe_dump(content, f)
+
+
+@pytest.fixture
+def export_dir(tmp_path):
+    """A small version 1 Guru export: a board with two cards and a section, and two cards at the top level."""
+    root = tmp_path / 'export'
+    for directory in ('cards', 'boards', 'board-groups', 'folders', 'resources'):
+        os.makedirs(root / directory)
+    write_yaml(root / 'collection.yaml', {'Items': [{'ID': 'b1', 'Title': 'Board', 'Type': 'board'},
+                                                    {'ID': 'card3', 'Title': 'FAQ', 'Type': 'card'},
+                                                    {'ID': 'card4', 'Title': 'Welcome', 'Type': 'card'}]})
+    write_yaml(root / 'boards' / 'b1.yaml', {'Title': 'Board', 'Items': [
+        {'ID': 'card1', 'Type': 'card'},
+        {'Title': 'Section', 'Type': 'section', 'Items': [{'ID': 'card2', 'Type': 'card'}]}]})
+    for card_id, (title, html) in CARDS.items():
+        write_yaml(root / 'cards' / (card_id + '.yaml'), {'ID': card_id, 'Slug': 'slug-' + card_id, 'Title': title,
+                                                         'Tags': ['tag-' + card_id],
+                                                         'externalLastUpdated': 1670000000000})
+        (root / 'cards' / (card_id + '.html')).write_text(html)
+    (root / 'resources' / 'logo.png').write_bytes(b'\x89PNG logo')
+    (root / 'resources' / 'faq.pdf').write_bytes(b'%PDF faq')
+    return root
+
+
+@pytest.fixture
+def stub():
+    stub = ConfluenceStub().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def make_config(tmp_path, stub, export_dir):
+    def make_config(**options):
+        options = dict({'space_key': 'SP', 'parent': '1', 'user': 'user', 'api_key': 'key',
+                        'collection_dir': str(export_dir), 'target_url': stub.url, 'migrate_tags': True,
+                        'parse_workers': 1, 'journal': str(tmp_path / 'journal.jsonl'),
+                        'manifest': str(tmp_path / 'manifest.json')}, **options)
+        return ImportConfig(**options)
+
+    return make_config
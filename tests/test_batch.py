@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import write_yaml
+from guru_confluence_importer.batch import BatchImporter
+from guru_confluence_importer.config import load_batch
+
+
+def test_batch_imports_collections_into_one_space(stub, make_config, export_dir, tmp_path):
+    write_yaml(tmp_path / 'batch.yaml', {'defaults': {'collection_dir': str(export_dir)},
+                                         'collections': [{'name': 'first', 'parent': '10'},
+                                                         {'name': 'second', 'parent': '20'}]})
+    collections = load_batch(str(tmp_path / 'batch.yaml'), make_config(journal=None, manifest=None),
+                             str(tmp_path / 'run'))
+    assert [(name, config.parent) for name, config in collections] == [('first', '10'), ('second', '20')]
+    assert collections[0][1].journal == str(tmp_path / 'run_first_journal.jsonl')
+    assert collections[0][1].root_key != collections[1][1].root_key
+
+    summary = BatchImporter(collections).run()
+    assert summary['failed'] == 0 and summary['failed_collections'] == 0
+    assert summary['pages'] == 12
+    assert len(stub.pages) == 12
+    # the collections share a title planner, so the second one gets free variants of the same titles
+    assert len({page['title'] for page in stub.pages.values()}) == 12
+    parents = sorted(page['ancestors'][0]['id'] for page in stub.pages.values()
+                     if page['ancestors'] and page['ancestors'][0]['id'] in ('10', '20'))
+    assert parents == ['10'] * 3 + ['20'] * 3
+
+
+def test_batch_reports_a_failed_collection_and_imports_the_rest(stub, make_config, tmp_path):
+    collections = [('missing', make_config(collection_dir=str(tmp_path / 'missing'), journal=None, manifest=None)),
+                   ('export', make_config(journal=None, manifest=None))]
+    summary = BatchImporter(collections).run()
+    assert summary['failed_collections'] == 1
+    assert [report['name'] for report in summary['collections'] if 'error' in report] == ['missing']
+    assert summary['pages'] == 6
+    assert len(stub.pages) == 6
+
+
+def test_load_batch_rejects_connection_fields_and_duplicate_names(make_config, tmp_path):
+    write_yaml(tmp_path / 'shared.yaml', {'collections': [{'name': 'a', 'pool_size': 4}]})
+    with pytest.raises(ValueError, match='pool_size'):
+        load_batch(str(tmp_path / 'shared.yaml'), make_config())
+    write_yaml(tmp_path / 'twice.yaml', {'collections': [{'name': 'a'}, {'name': 'a'}]})
+    with pytest.raises(ValueError, match='used twice'):
+        load_batch(str(tmp_path / 'twice.yaml'), make_config())
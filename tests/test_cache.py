@@ -0,0 +1,43 @@
+from guru_confluence_importer.cache import BodyCache
+from guru_confluence_importer.importer import Importer
+from guru_confluence_importer.transform import TransformResult
+
+
+def body(content):
+    result = TransformResult('Title')
+    result.content = content
+    return result
+
+
+def test_body_cache_evicts_least_recently_used(tmp_path):
+    # every entry is 100 bytes of body and 12 bytes of references
+    cache = BodyCache(str(tmp_path / 'bodies.sqlite'), max_bytes=300)
+    for name in ('a', 'b'):
+        cache.store(name, body(name * 100))
+    assert cache.get('a').content == 'a' * 100
+    cache.store('c', body('c' * 100))
+    assert cache.lookup('b') is None
+    assert cache.lookup('a') is not None and cache.lookup('c') is not None
+    assert cache.hits == 1 and cache.stored == 3
+    cache.close()
+
+    # a different converter configuration never serves the stored bodies
+    cache.open()
+    other = BodyCache(str(tmp_path / 'bodies.sqlite'), transform_options=('lxml', None, None))
+    assert other.key('hash') != cache.key('hash')
+    other.close()
+    cache.close()
+
+
+def test_second_import_converts_no_body(stub, make_config, tmp_path):
+    path = str(tmp_path / 'bodies.sqlite')
+    first = Importer(make_config(body_cache=path))
+    first.run()
+    assert first.body_cache.stored == 6 and first.body_cache.hits == 0
+    versions = {page_id: page['version']['number'] for page_id, page in stub.pages.items()}
+
+    second = Importer(make_config(body_cache=path, sync=True))
+    summary = second.run()
+    assert second.body_cache.hits == 6 and second.body_cache.stored == 0
+    assert summary['failed'] == 0
+    assert {page_id: page['version']['number'] for page_id, page in stub.pages.items()} == versions
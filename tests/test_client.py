@@ -0,0 +1,83 @@
+import email.utils
+import time
+
+import requests
+
+from guru_confluence_importer.client import AdaptiveTokenBucket
+from guru_confluence_importer.client import ConfluenceClient
+from guru_confluence_importer.client import DUPLICATE_TITLE
+from guru_confluence_importer.client import PERMANENT
+from guru_confluence_importer.client import RetryPolicy
+from guru_confluence_importer.client import THROTTLE
+from guru_confluence_importer.client import TRANSIENT
+from guru_confluence_importer.client import classify_response
+from guru_confluence_importer.client import parse_retry_after
+
+
+def response(status_code, text='', headers=None):
+    raw_response = requests.Response()
+    raw_response.status_code = status_code
+    raw_response._content = text.encode('utf-8')
+    raw_response.headers.update(headers or {})
+    return raw_response
+
+
+def test_classify_response():
+    assert classify_response(response(200)) is None
+    assert classify_response(response(429)) == THROTTLE
+    assert classify_response(response(503, headers={'Retry-After': '5'})) == THROTTLE
+    assert classify_response(response(503)) == TRANSIENT
+    assert classify_response(response(500)) == TRANSIENT
+    assert classify_response(response(408)) == TRANSIENT
+    assert classify_response(response(400, '{"message": "A page already exists with the same TITLE in this '
+                                           'space"}')) == DUPLICATE_TITLE
+    assert classify_response(response(400, '{"message": "Invalid body"}')) == PERMANENT
+    assert classify_response(response(404)) == PERMANENT
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after('-3') == 0.0
+    assert parse_retry_after('soon') is None
+    assert 25 < parse_retry_after(email.utils.formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(email.utils.formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=10.0)
+    assert policy.should_retry(THROTTLE, 1)
+    assert policy.should_retry(TRANSIENT, 2)
+    assert not policy.should_retry(TRANSIENT, 3)
+    assert not policy.should_retry(PERMANENT, 1)
+    assert not policy.should_retry(DUPLICATE_TITLE, 1)
+    for attempt in range(1, 8):
+        assert 0 <= policy.delay(attempt) <= min(10.0, 2 ** (attempt - 1))
+    assert 5.0 <= policy.delay(1, retry_after=5.0) <= 6.0
+    assert 10.0 <= policy.delay(1, retry_after=120.0) <= 11.0
+
+
+def client_for(stub, max_attempts=6, min_rate=0.5):
+    return ConfluenceClient(None, 'user', 'key', retry_policy=RetryPolicy(max_attempts, base_delay=0.01),
+                            rate_limiter=AdaptiveTokenBucket(min_rate=min_rate), base_url=stub.url)
+
+
+def test_throttled_requests_are_retried(stub):
+    stub.throttle_rate = 0.3
+    stub.retry_after = 0
+    # every 429 halves the rate, the floor keeps the test fast
+    client = client_for(stub, max_attempts=20, min_rate=100.0)
+    for number in range(10):
+        client.create_confluence_page('SP', '1', 'Page ' + str(number), '<p>body</p>')
+    assert len(stub.pages) == 10
+    assert stub.requests.get('throttled', 0) > 0
+
+
+def test_lost_create_is_adopted(stub):
+    client = client_for(stub)
+    parent = client.create_confluence_page('SP', '1', 'Parent', '<p>parent</p>')
+    stub.lost_create_rate = 1.0
+    page = client.create_confluence_page('SP', parent['id'], 'Child', '<p>child</p>')
+    assert page['title'] == 'Child'
+    assert page['ancestors'][-1]['id'] == parent['id']
+    assert len(stub.pages) == 2
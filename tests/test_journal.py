@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from guru_confluence_importer.importer import Importer
+from guru_confluence_importer.state import ImportJournal
+
+
+def test_journal_replay(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = ImportJournal(path)
+    journal.record('created', 'root/card1', page_id='101', title='Welcome')
+    journal.record('labelled', 'root/card1')
+    journal.record('uploaded', 'root/card1', file='logo.png')
+    journal.record('updated', 'root/card1', version=2)
+    journal.record('done', 'root/card1')
+    journal.record('created', 'root/card2', page_id='102', title='Setup')
+    journal.close()
+    with open(path, 'a') as f:
+        # the previous run died while writing this line
+        f.write('{"event": "done", "ke')
+
+    resumed = ImportJournal(path, resume=True)
+    assert resumed.pages == {'root/card1': '101', 'root/card2': '102'}
+    assert resumed.titles['root/card2'] == 'Setup'
+    assert resumed.labelled == {'root/card1'}
+    assert resumed.is_uploaded('root/card1', 'logo.png')
+    assert not resumed.is_uploaded('root/card2', 'logo.png')
+    assert resumed.versions == {'root/card1': 2}
+    assert resumed.done == {'root/card1'}
+    resumed.close()
+
+
+def test_resume_finishes_an_interrupted_import(stub, make_config, tmp_path):
+    # one worker, so every page is finished before the next one is created
+    Importer(make_config()).run()
+    pages = dict(stub.pages)
+    with open(tmp_path / 'journal.jsonl') as f:
+        entries = [json.loads(line) for line in f]
+
+    # the run died right after the second page was created: later pages do not exist yet
+    created = [entry for entry in entries if entry['event'] == 'created']
+    cut = entries.index(created[1]) + 1
+    with open(tmp_path / 'journal.jsonl', 'w') as f:
+        f.writelines(json.dumps(entry) + '\n' for entry in entries[:cut])
+    for entry in created[2:]:
+        page = stub.pages.pop(entry['page_id'])
+        del stub.titles[(page['space']['key'], page['title'])]
+    # nor was anything added to the second page after its creation
+    stub.pages[created[1]['page_id']].update({'version': {'number': 1}, 'labels': [], 'attachments': []})
+
+    summary = Importer(make_config(resume=True)).run()
+    assert summary['failed'] == 0
+    assert sorted(page['title'] for page in stub.pages.values()) == sorted(page['title'] for page in pages.values())
+    for entry in created[:2]:
+        assert entry['page_id'] in stub.pages
+    journal = ImportJournal(str(tmp_path / 'journal.jsonl'), resume=True)
+    assert set(journal.done) == set(journal.pages)
+    journal.close()
+
+
+def reject_files_and_labels(stub):
+    stub.add_attachments = lambda page_id, body: (413, {'statusCode': 413, 'message': 'Request too large'})
+    stub.add_labels = lambda page_id, labels: (403, {'statusCode': 403, 'message': 'Not permitted'})
+
+
+def attachments_and_labels(stub):
+    return sum(len(page['attachments']) for page in stub.pages.values()), \
+        sum(len(page['labels']) for page in stub.pages.values())
+
+
+def test_failed_uploads_and_labels_are_resumed(stub, make_config, tmp_path):
+    reject_files_and_labels(stub)
+    summary = Importer(make_config()).run()
+    # card1 and card3 have a file, every card has a tag
+    assert summary['failed'] == 4
+    assert attachments_and_labels(stub) == (0, 0)
+    journal = ImportJournal(str(tmp_path / 'journal.jsonl'), resume=True)
+    assert len(journal.done) == len(journal.pages) - 4
+    journal.close()
+
+    del stub.add_attachments, stub.add_labels
+    summary = Importer(make_config(resume=True)).run()
+    assert summary['failed'] == 0
+    assert attachments_and_labels(stub) == (2, 4)
+    assert len(stub.pages) == 6
+
+
+def test_failed_deferred_labels_are_counted_and_resumed(stub, make_config):
+    stub.add_labels = lambda page_id, labels: (403, {'statusCode': 403, 'message': 'Not permitted'})
+    summary = Importer(make_config(labels_mode='deferred')).run()
+    assert summary['failed'] == 4
+
+    del stub.add_labels
+    summary = Importer(make_config(labels_mode='deferred', resume=True)).run()
+    assert summary['failed'] == 0
+    assert attachments_and_labels(stub) == (2, 4)
+
+
+def test_resume_adopts_pages_whose_create_was_not_answered(stub, make_config, export_dir, tmp_path):
+    # the stub creates the pages but holds back the answers, the import is killed while they are in flight
+    create_page = stub.create_page
+    held = threading.Semaphore(0)
+    release = threading.Event()
+
+    def create_and_hold(data):
+        status, page = create_page(data)
+        if len(stub.pages) > 1:
+            held.release()
+            release.wait(30)
+        return status, page
+
+    stub.create_page = create_and_hold
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, '-m', 'guru_confluence_importer', '--collection-dir', str(export_dir),
+                                '--space-key', 'SP', '--parent', '1', '--user', 'user', '--api-key', 'key',
+                                '--target-url', stub.url, '--workers', '4', '--quiet',
+                                '--journal', str(tmp_path / 'journal.jsonl')],
+                               cwd=str(tmp_path), env=dict(os.environ, PYTHONPATH=root))
+    try:
+        for request in range(2):
+            assert held.acquire(timeout=30)
+    finally:
+        process.kill()
+        process.wait()
+        release.set()
+    stub.create_page = create_page
+    created = dict(stub.pages)
+
+    summary = Importer(make_config(resume=True, workers=4)).run()
+    assert summary['failed'] == 0
+    assert len(stub.pages) == 6
+    assert set(created) <= set(stub.pages)
+    assert sorted(page['title'] for page in stub.pages.values()) == ['Board', 'FAQ', 'Section', 'Setup', 'Welcome',
+                                                                     'Welcome (in multiple boards 2)']
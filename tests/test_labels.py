@@ -0,0 +1,38 @@
+import pytest
+import yaml
+
+from guru_confluence_importer.importer import Importer
+from guru_confluence_importer.pages import normalize_label
+
+LABEL_REQUESTS = 'POST /wiki/rest/api/content/{id}/label'
+
+
+def test_normalize_label():
+    assert normalize_label('Q&A: how?') == 'Q-A--how-'
+    assert normalize_label('plain-tag') == 'plain-tag'
+    assert normalize_label(2024) == '2024'
+
+
+def labels_by_title(stub):
+    return {page['title']: sorted(page['labels']) for page in stub.pages.values() if page['labels']}
+
+
+@pytest.mark.parametrize('labels_mode, label_requests', [('separate', 4), ('deferred', 4), ('inline', 0)])
+def test_label_modes(stub, make_config, export_dir, labels_mode, label_requests):
+    with open(export_dir / 'cards' / 'card1.yaml') as f:
+        card = yaml.safe_load(f)
+    card['Tags'] = ['Q&A: how?', 'setup guide']
+    with open(export_dir / 'cards' / 'card1.yaml', 'w') as f:
+        yaml.safe_dump(card, f)
+
+    summary = Importer(make_config(labels_mode=labels_mode)).run()
+    assert summary['failed'] == 0
+    assert labels_by_title(stub) == {'Welcome': ['Q-A--how-', 'setup-guide'], 'Setup': ['tag-card2'],
+                                     'FAQ': ['tag-card3'], 'Welcome (in multiple boards 2)': ['tag-card4']}
+    assert stub.requests.get(LABEL_REQUESTS, 0) == label_requests
+
+
+def test_labels_need_migrate_tags(stub, make_config):
+    Importer(make_config(migrate_tags=False)).run()
+    assert labels_by_title(stub) == {}
+    assert LABEL_REQUESTS not in stub.requests
@@ -0,0 +1,97 @@
+from guru_confluence_importer.importer import Importer
+from guru_confluence_importer.pages import CardLinkIndex
+from guru_confluence_importer.pages import ConfluencePage
+from guru_confluence_importer.transform import transform_html
+
+
+def page_bodies(stub):
+    return {page['title']: page['body']['storage']['value'] for page in stub.pages.values()}
+
+
+def link_to_setup(export_dir):
+    # card3 is uploaded before card2, the card it links to
+    link = '<a href="https://app.getguru.com/card/slug-card2/Setup">setup</a>'
+    (export_dir / 'cards' / 'card3.html').write_text('<p>Read the ' + link + '</p>')
+
+
+def test_rewrite_links_known_cards():
+    index = CardLinkIndex()
+    target = ConfluencePage('FAQ <more>', '-1', '1', '', 'card3')
+    index.add(target, {'ID': 'card3', 'Slug': 'slug-card3/FAQ'})
+    content = transform_html('<a href="https://app.getguru.com/card/slug-card3/FAQ">faq</a>'
+                             '<a href="https://app.getguru.com/card/unknown/Other">other</a>').content
+    rewritten, pending = index.rewrite(content, 'Card')
+    assert '<ri:page ri:content-title="FAQ &lt;more&gt;"></ri:page><ac:link-body>faq</ac:link-body>' in rewritten
+    assert pending == ['unknown']
+    index.complete = True
+    rewritten, pending = index.rewrite(content, 'Card')
+    assert '<a href="https://app.getguru.com/card/unknown/Other">other</a>' in rewritten
+    assert pending == []
+
+
+def reject_title_once(stub, title):
+    # a page created by someone else after the space was listed: the card gets the next title variant
+    create_page = stub.create_page
+    rejected = []
+
+    def create_or_reject(data):
+        if data['title'] == title and not rejected:
+            rejected.append(title)
+            create_page({'title': title, 'space': data['space'], 'ancestors': [{'id': '1'}],
+                         'body': {'storage': {'value': '<p>someone else</p>', 'representation': 'storage'}}})
+        return create_page(data)
+
+    stub.create_page = create_or_reject
+
+
+def reject_link_updates(stub):
+    update_page = stub.update_page
+
+    def update_or_reject(page_id, data):
+        if 'ri:content-title="Setup (in multiple boards 2)"' in data['body']['storage']['value']:
+            return 403, {'statusCode': 403, 'message': 'Not permitted'}
+        return update_page(page_id, data)
+
+    stub.update_page = update_or_reject
+    return update_page
+
+
+def test_links_to_renamed_cards_are_fixed_up(stub, make_config, export_dir):
+    link_to_setup(export_dir)
+    reject_title_once(stub, 'Setup')
+    summary = Importer(make_config()).run()
+    assert summary['failed'] == 0
+    assert 'ri:content-title="Setup (in multiple boards 2)"' in page_bodies(stub)['FAQ']
+
+
+def test_links_to_later_cards_in_stream_mode(stub, make_config, export_dir):
+    link_to_setup(export_dir)
+    summary = Importer(make_config(stream=True, queue_size=1)).run()
+    assert summary['failed'] == 0
+    assert 'ri:content-title="Setup"' in page_bodies(stub)['FAQ']
+
+
+def test_failed_link_update_is_counted_and_resumed(stub, make_config, export_dir):
+    link_to_setup(export_dir)
+    reject_title_once(stub, 'Setup')
+    update_page = reject_link_updates(stub)
+    summary = Importer(make_config()).run()
+    assert summary['failed'] == 1
+    assert 'ri:content-title="Setup"' in page_bodies(stub)['FAQ']
+
+    stub.update_page = update_page
+    summary = Importer(make_config(resume=True)).run()
+    assert summary['failed'] == 0
+    assert 'ri:content-title="Setup (in multiple boards 2)"' in page_bodies(stub)['FAQ']
+
+
+def test_failed_link_update_is_synced(stub, make_config, export_dir):
+    link_to_setup(export_dir)
+    reject_title_once(stub, 'Setup')
+    update_page = reject_link_updates(stub)
+    assert Importer(make_config()).run()['failed'] == 1
+
+    stub.update_page = update_page
+    assert Importer(make_config(sync=True)).run()['failed'] == 0
+    assert 'ri:content-title="Setup (in multiple boards 2)"' in page_bodies(stub)['FAQ']
+    assert len(stub.pages) == 7
@@ -0,0 +1,72 @@
+import json
+import logging
+
+import pytest
+
+from guru_confluence_importer.importer import Importer
+from guru_confluence_importer.logs import EventSampler
+from guru_confluence_importer.logs import JsonFormatter
+from guru_confluence_importer.logs import PageContextFilter
+from guru_confluence_importer.logs import PayloadTruncationFilter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+@pytest.fixture
+def json_log():
+    """Collects the JSON lines of every record logged meanwhile, filtered like configure_logging does."""
+    handler = ListHandler()
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(PageContextFilter())
+    root = logging.getLogger()
+    level = root.level
+    root.setLevel(logging.INFO)
+    root.addHandler(handler)
+    yield handler.lines
+    root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def make_record(message, args=None, **extra):
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_payload_truncation_cuts_only_payload_records():
+    truncation = PayloadTruncationFilter(10)
+    record = make_record('ERROR data: %s', ('x' * 100,), payload=True)
+    assert truncation.filter(record)
+    assert record.getMessage() == 'ERROR data ... [102 characters truncated]'
+    record = make_record('FILE UPLOADED ' + 'x' * 100)
+    truncation.filter(record)
+    assert len(record.getMessage()) == 114
+
+
+def test_event_sampler_keeps_every_nth_event_and_all_errors():
+    sampler = EventSampler(3)
+    kept = [sampler.filter(make_record('UPLOADED', event='uploaded')) for n in range(7)]
+    assert kept == [True, False, False, True, False, False, True]
+    assert sampler.filter(make_record('CREATED', event='created'))
+    error = make_record('UPLOAD FAILED', event='uploaded')
+    error.levelno = logging.ERROR
+    assert sampler.filter(error)
+
+
+def test_json_records_carry_the_page_context(stub, make_config, json_log):
+    Importer(make_config()).run()
+    entries = [json.loads(line) for line in json_log]
+    uploaded = [entry for entry in entries if entry.get('event') == 'uploaded']
+    assert sorted(entry['file'] for entry in uploaded) == ['faq.pdf', 'logo.png']
+    for entry in uploaded:
+        page = stub.pages[entry['page_id']]
+        assert entry['file'] in page['attachments']
+        assert entry['title'] == page['title']
+        assert entry['guru_id'] in ('card1', 'card3')
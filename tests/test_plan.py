@@ -0,0 +1,46 @@
+import json
+import os
+
+import pytest
+
+from guru_confluence_importer.importer import Importer
+
+
+def read_plan(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_plan_round_trip(stub, make_config, export_dir, tmp_path):
+    path = str(tmp_path / 'plan.jsonl')
+    summary = Importer(make_config(plan=path)).compile_plan(path)
+    assert stub.requests == {}
+    records = read_plan(path)
+    assert records[0]['plan'] == 1
+    pages = records[1:-1]
+    assert len(pages) == summary['pages'] == 6
+    assert records[-1]['summary']['requests'] == summary['requests']
+    assert sorted(f['name'] for page in pages for f in page['files']) == ['faq.pdf', 'logo.png']
+
+    # executing the plan only reads the files of the export
+    for name in os.listdir(export_dir / 'cards'):
+        os.remove(export_dir / 'cards' / name)
+    summary = Importer(make_config(execute_plan=path)).run()
+    assert summary['failed'] == 0
+    assert len(stub.pages) == 6
+    # titles are planned against the space when the plan is executed
+    assert sorted(page['title'] for page in stub.pages.values()) == \
+        ['Board', 'FAQ', 'Section', 'Setup', 'Welcome', 'Welcome (in multiple boards 2)']
+    assert sorted(name for page in stub.pages.values() for name in page['attachments']) == ['faq.pdf', 'logo.png']
+    assert sorted(label for page in stub.pages.values() for label in page['labels']) == \
+        ['tag-card1', 'tag-card2', 'tag-card3', 'tag-card4']
+    faq = next(page for page in stub.pages.values() if page['title'] == 'FAQ')
+    assert faq['body']['storage']['value'] == next(page['body'] for page in pages if page['title'] == 'FAQ')
+
+
+def test_execute_plan_rejects_different_options(stub, make_config, tmp_path):
+    path = str(tmp_path / 'plan.jsonl')
+    Importer(make_config(plan=path)).compile_plan(path)
+    with pytest.raises(ValueError, match='attachment_strategy'):
+        Importer(make_config(execute_plan=path, attachment_strategy='shared')).run()
+    assert len(stub.pages) == 0
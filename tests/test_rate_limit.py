@@ -0,0 +1,75 @@
+import threading
+import time
+
+from guru_confluence_importer.client import AdaptiveTokenBucket
+
+
+def test_unlimited_until_throttled():
+    bucket = AdaptiveTokenBucket()
+    started = time.monotonic()
+    for request in range(200):
+        bucket.acquire()
+        bucket.release()
+        bucket.on_success()
+    assert time.monotonic() - started < 0.5
+    assert bucket.rate is None
+    bucket.on_throttle()
+    assert bucket.rate is not None and bucket.rate >= bucket.min_rate
+
+
+def test_max_rate_limits_requests():
+    bucket = AdaptiveTokenBucket(max_rate=20.0)
+    # the first max_rate tokens are available right away
+    for request in range(20):
+        bucket.acquire()
+        bucket.release()
+    started = time.monotonic()
+    for request in range(5):
+        bucket.acquire()
+        bucket.release()
+    assert time.monotonic() - started >= 0.2
+
+
+def test_throttle_episode_decreases_once():
+    bucket = AdaptiveTokenBucket(max_rate=16.0)
+    for request in range(4):
+        bucket.acquire()
+    bucket.on_throttle(hold=10.0)
+    bucket.on_throttle(hold=10.0)
+    bucket.on_throttle(hold=10.0)
+    assert bucket.rate == 8.0
+    assert bucket.concurrency == 2
+    bucket.hold_until = 0.0
+    bucket.on_throttle()
+    assert bucket.rate == 4.0
+    assert bucket.concurrency == 1
+
+
+def test_recovery_after_throttle():
+    bucket = AdaptiveTokenBucket(max_rate=10.0, recovery=0.5)
+    bucket.acquire()
+    bucket.on_throttle()
+    assert bucket.rate == 5.0
+    assert bucket.concurrency == 1
+    for success in range(3):
+        bucket.on_success()
+    assert bucket.rate == 10.0
+    assert bucket.concurrency == 3
+
+
+def test_concurrency_limit_blocks_acquire():
+    bucket = AdaptiveTokenBucket(max_rate=1000.0)
+    bucket.acquire()
+    bucket.on_throttle()
+    assert bucket.concurrency == 1
+    bucket.tokens = 100
+    acquired = threading.Event()
+
+    def second_request():
+        bucket.acquire()
+        acquired.set()
+
+    threading.Thread(target=second_request, daemon=True).start()
+    assert not acquired.wait(0.2)
+    bucket.release()
+    assert acquired.wait(2)
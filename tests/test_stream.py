@@ -0,0 +1,24 @@
+from guru_confluence_importer.importer import Importer
+
+WRITES = ('POST /wiki/rest/api/content', 'PUT /wiki/rest/api/content/{id}',
+          'POST /wiki/rest/api/content/{id}/child/attachment', 'POST /wiki/rest/api/content/{id}/label')
+
+
+def test_stream_imports_the_same_pages(stub, make_config):
+    summary = Importer(make_config(stream=True, workers=3, queue_size=2)).run()
+    assert summary['failed'] == 0
+    pages = {page['title']: page for page in stub.pages.values()}
+    assert sorted(pages) == ['Board', 'FAQ', 'Section', 'Setup', 'Welcome', 'Welcome (in multiple boards 2)']
+    assert pages['Setup']['ancestors'][-1]['id'] == pages['Section']['id']
+    assert pages['Welcome']['attachments'] == ['logo.png']
+    assert 'ri:content-title="Welcome"' in pages['Setup']['body']['storage']['value']
+
+
+def test_switching_modes_keeps_unchanged_cards(stub, make_config):
+    Importer(make_config()).run()
+    writes = [stub.requests.get(endpoint, 0) for endpoint in WRITES]
+
+    Importer(make_config(sync=True, stream=True)).run()
+    assert [stub.requests.get(endpoint, 0) for endpoint in WRITES] == writes
+    Importer(make_config(sync=True)).run()
+    assert [stub.requests.get(endpoint, 0) for endpoint in WRITES] == writes
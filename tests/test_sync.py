@@ -0,0 +1,40 @@
+import json
+
+from guru_confluence_importer.importer import Importer
+
+
+def test_sync_skips_unchanged_and_updates_changed_pages(stub, make_config, export_dir):
+    Importer(make_config()).run()
+    versions = {page_id: page['version']['number'] for page_id, page in stub.pages.items()}
+    writes = dict(stub.requests)
+
+    Importer(make_config(sync=True)).run()
+    for endpoint in ('POST /wiki/rest/api/content', 'PUT /wiki/rest/api/content/{id}',
+                     'POST /wiki/rest/api/content/{id}/child/attachment'):
+        assert stub.requests.get(endpoint, 0) == writes.get(endpoint, 0)
+    assert {page_id: page['version']['number'] for page_id, page in stub.pages.items()} == versions
+
+    (export_dir / 'cards' / 'card3.html').write_text('<p>Questions, answered</p><a href="resources/faq.pdf">faq</a>')
+    Importer(make_config(sync=True)).run()
+    changed = [page for page in stub.pages.values() if page['version']['number'] != versions[page['id']]]
+    assert [page['title'] for page in changed] == ['FAQ']
+    assert 'answered' in changed[0]['body']['storage']['value']
+    assert len(stub.pages) == len(versions)
+
+
+def test_sync_uploads_files_that_failed_before(stub, make_config, tmp_path):
+    stub.add_attachments = lambda page_id, body: (413, {'statusCode': 413, 'message': 'Request too large'})
+    summary = Importer(make_config()).run()
+    assert summary['failed'] == 2
+    with open(tmp_path / 'manifest.json') as f:
+        manifest = json.load(f)
+    assert all(entry['files'] == [] for entry in manifest.values())
+
+    del stub.add_attachments
+    summary = Importer(make_config(sync=True)).run()
+    assert summary['failed'] == 0
+    assert sorted(name for page in stub.pages.values() for name in page['attachments']) == ['faq.pdf', 'logo.png']
+    assert len(stub.pages) == 6
+    with open(tmp_path / 'manifest.json') as f:
+        manifest = json.load(f)
+    assert sorted(name for entry in manifest.values() for name in entry['files']) == ['faq.pdf', 'logo.png']
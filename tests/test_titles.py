@@ -0,0 +1,43 @@
+from guru_confluence_importer.pages import ConfluencePage
+from guru_confluence_importer.pages import TitlePlanner
+
+
+def plan(titles, existing=None, owned=None):
+    planner = TitlePlanner(existing, owned)
+    root = ConfluencePage('Root', '1', '', '', 'root')
+    nodes = []
+    for title in titles:
+        node = ConfluencePage(title, '-1', root.id)
+        root.add_child(node)
+        planner.assign(node)
+        nodes.append(node)
+    return planner, nodes
+
+
+def test_titles_are_deterministic():
+    titles = ['Welcome', 'FAQ', 'welcome', 'Welcome', 'FAQ']
+    first = [node.title for node in plan(titles)[1]]
+    second = [node.title for node in plan(titles)[1]]
+    assert first == second
+    assert first == ['Welcome', 'FAQ', 'welcome (in multiple boards 2)', 'Welcome (in multiple boards 3)',
+                     'FAQ (in multiple boards 2)']
+
+
+def test_existing_titles_are_avoided():
+    planner, nodes = plan(['Welcome', 'Other'], existing={'WELCOME': '42'})
+    assert [node.title for node in nodes] == ['Welcome (in multiple boards 2)', 'Other']
+
+
+def test_owned_pages_keep_their_title():
+    root = ConfluencePage('Root', '1', '', '', 'root')
+    node = ConfluencePage('Welcome', '-1', root.id, '', 'card1')
+    root.add_child(node)
+    planner = TitlePlanner({'Welcome': '42'}, {node.key: '42'})
+    planner.assign(node)
+    assert node.title == 'Welcome'
+
+
+def test_reassign_picks_the_next_free_variant():
+    planner, nodes = plan(['Welcome', 'Welcome'])
+    planner.reassign(nodes[0])
+    assert nodes[0].title == 'Welcome (in multiple boards 3)'
@@ -0,0 +1,39 @@
+import pytest
+
+from guru_confluence_importer.transform import TRANSFORM_RULES
+from guru_confluence_importer.transform import transform_html
+
+SAMPLES = [
+    '<p>Hello &amp; <b>bold</b></p><hr class="divider"/>',
+    '<iframe src="https://example.com/embed" width="50%"></iframe>',
+    '<p><img src="resources/logo.png"/><img/></p>',
+    '<a href="resources/guide.pdf">guide</a><a href="https://example.com">elsewhere</a>',
+    '<a href="https://app.getguru.com/card/iXyzAbcT/Card-Title">card <i>link</i></a>',
+    '<ul><li>one<br/>two</li></ul><table><tr><td>cell</td></tr></table>',
+]
+
+
+def test_samples_cover_every_rule():
+    tags = set()
+    for html in SAMPLES:
+        tags.update(tag for tag in TRANSFORM_RULES if '<' + tag in html)
+    assert tags == set(TRANSFORM_RULES)
+
+
+@pytest.mark.parametrize('html', SAMPLES)
+def test_lxml_matches_html_parser(html):
+    pytest.importorskip('lxml')
+    expected = transform_html(html, 'Card', 'html.parser', {'guide.pdf': 'manual.pdf'}, 'Assets')
+    result = transform_html(html, 'Card', 'lxml', {'guide.pdf': 'manual.pdf'}, 'Assets')
+    assert result.content == expected.content
+    assert result.images == expected.images
+    assert result.attachments == expected.attachments
+    assert result.links == expected.links
+
+
+def test_references_are_collected():
+    result = transform_html(''.join(SAMPLES), 'Card', aliases={'guide.pdf': 'manual.pdf'})
+    assert result.images == ['logo.png']
+    assert result.attachments == ['manual.pdf']
+    assert result.links == ['iXyzAbcT']
+    assert 'ri:filename="manual.pdf"' in result.content
@@ -0,0 +1,75 @@
+import email.parser
+
+from guru_confluence_importer.client import MultipartFileStream
+from guru_confluence_importer.export import DirectorySource
+from guru_confluence_importer.importer import Importer
+from guru_confluence_importer.uploads import split_batches
+
+ATTACHMENT_UPLOADS = 'POST /wiki/rest/api/content/{id}/child/attachment'
+
+
+def test_split_batches_by_count_and_size():
+    items = [('a', 'IMAGE', None, 10), ('b', 'IMAGE', None, 10), ('c', 'IMAGE', None, 10), ('big', 'IMAGE', None, 100),
+             ('d', 'IMAGE', None, 10)]
+    assert [[item[0] for item in batch] for batch in split_batches(items, 2, 1000)] == [['a', 'b'], ['c', 'big'],
+                                                                                       ['d']]
+    assert [[item[0] for item in batch] for batch in split_batches(items, 10, 50)] == [['a', 'b', 'c'], ['big'],
+                                                                                      ['d']]
+    assert split_batches([], 10, 50) == []
+
+
+def test_multipart_stream_reads_files_in_chunks(export_dir):
+    source = DirectorySource(str(export_dir))
+    sent = []
+    stream = MultipartFileStream([('logo.png', 'resources/logo.png'), ('faq.pdf', 'resources/faq.pdf')], source,
+                                 on_file_sent=lambda file_name, size, seconds: sent.append((file_name, size)))
+    body = b''.join(iter(lambda: stream.read(3), b''))
+    assert len(body) == len(stream)
+    assert sent == [('logo.png', 9), ('faq.pdf', 8)]
+    message = email.parser.BytesParser().parsebytes(b'Content-Type: ' + stream.content_type.encode() + b'\r\n\r\n'
+                                                    + body)
+    parts = [(part.get_filename(), part.get_payload(decode=True)) for part in message.get_payload()]
+    assert parts == [('logo.png', b'\x89PNG logo'), ('faq.pdf', b'%PDF faq')]
+
+    # a retried request rewinds the stream and sends the same body
+    stream.seek(0)
+    assert b''.join(stream) == body
+    stream.close()
+
+
+def add_images(export_dir, count):
+    html = ''.join('<img src="resources/image{}.png"/>'.format(number) for number in range(count))
+    (export_dir / 'cards' / 'card1.html').write_text('<p>Pictures</p>' + html)
+    for number in range(count):
+        (export_dir / 'resources' / 'image{}.png'.format(number)).write_bytes(b'\x89PNG' + bytes(1000 * number))
+
+
+def attachments_of(stub, title):
+    return sorted(name for page in stub.pages.values() if page['title'] == title for name in page['attachments'])
+
+
+def test_files_are_uploaded_in_batches(stub, make_config, export_dir):
+    add_images(export_dir, 5)
+    summary = Importer(make_config(upload_batch_files=2)).run()
+    assert summary['failed'] == 0
+    assert attachments_of(stub, 'Welcome') == ['image{}.png'.format(number) for number in range(5)]
+    # three batches for card1, one for card3
+    assert stub.requests[ATTACHMENT_UPLOADS] == 4
+
+
+def test_parallel_batches_survive_throttling(stub, make_config, export_dir):
+    add_images(export_dir, 6)
+    add_attachments = stub.add_attachments
+    throttled = []
+
+    def throttle_first(page_id, body):
+        if not throttled:
+            throttled.append(page_id)
+            return 429, {'statusCode': 429, 'message': 'Rate limit exceeded'}
+        return add_attachments(page_id, body)
+
+    stub.add_attachments = throttle_first
+    summary = Importer(make_config(upload_batch_files=1, upload_workers=3, workers=2)).run()
+    assert summary['failed'] == 0
+    assert attachments_of(stub, 'Welcome') == ['image{}.png'.format(number) for number in range(6)]
+    assert stub.requests[ATTACHMENT_UPLOADS] == 8
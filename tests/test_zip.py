@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import zipfile
+
+import pytest
+
+from guru_confluence_importer.export import ExportLoader
+from guru_confluence_importer.export import ZipSource
+from guru_confluence_importer.importer import Importer
+
+
+def zip_export(export_dir, path, folder='guru-export/'):
+    # Guru puts the collection in a top level folder of the archive
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for directory, directories, file_names in os.walk(export_dir):
+            for file_name in file_names:
+                full_path = os.path.join(directory, file_name)
+                archive.write(full_path, folder + os.path.relpath(full_path, export_dir))
+    return str(path)
+
+
+def test_zip_source_index(export_dir, tmp_path):
+    source = ZipSource(zip_export(export_dir, tmp_path / 'export.zip'))
+    assert source.is_file('collection.yaml')
+    assert not source.is_file('cards/missing.yaml')
+    assert sorted(source.list('resources')) == ['faq.pdf', 'logo.png']
+    assert source.size('resources/logo.png') == 9
+    assert source.read_text('cards/card1.html') == '<p>Hello</p><img src="resources/logo.png"/>'
+    with pytest.raises(FileNotFoundError):
+        source.open('cards/missing.html')
+
+
+def test_zip_source_reopens_the_archive_in_another_process(export_dir, tmp_path):
+    source = ZipSource(zip_export(export_dir, tmp_path / 'export.zip'))
+    source.read_text('collection.yaml')
+    archive = source.archive
+    # what a forked worker sees: the parent's handle, opened by another process
+    source.owner = -1
+    assert source.read_text('cards/card2.html').startswith('<p>See')
+    assert source.archive is not archive
+    assert source.owner == os.getpid()
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs the fork start method')
+def test_forked_loaders_read_an_opened_archive(export_dir, tmp_path):
+    for number in range(300):
+        card = 'ID: bulk{0}\nTitle: Bulk {0}\n'.format(number)
+        (export_dir / 'cards' / 'bulk{}.yaml'.format(number)).write_text(card)
+        (export_dir / 'cards' / 'bulk{}.html'.format(number)).write_text('<p>{}</p>'.format('text ' * 2000))
+    source = ZipSource(zip_export(export_dir, tmp_path / 'export.zip'))
+    # the parent process has the archive open while the loader processes are forked
+    source.read_text('collection.yaml')
+    context = multiprocessing.get_start_method()
+    multiprocessing.set_start_method('fork', force=True)
+    try:
+        loader = ExportLoader(source, workers=4, transform_options=('html.parser', None, None))
+        loader.load()
+    finally:
+        multiprocessing.set_start_method(context, force=True)
+    assert len(loader.cards) == 304
+    assert all(rendered is not None for html_hash, html, rendered in loader.cards.values())
+
+
+def test_import_from_zip(stub, make_config, export_dir, tmp_path):
+    path = zip_export(export_dir, tmp_path / 'export.zip')
+    summary = Importer(make_config(collection_dir=None, collection_zip=path, parse_workers=2)).run()
+    assert summary['failed'] == 0
+    assert sorted(page['title'] for page in stub.pages.values()) == ['Board', 'FAQ', 'Section', 'Setup', 'Welcome',
+                                                                     'Welcome (in multiple boards 2)']
+    assert sorted(name for page in stub.pages.values() for name in page['attachments']) == ['faq.pdf', 'logo.png']